@@ -472,6 +472,119 @@ def drawPixel_P(r0, r1, r2):
     
     ldrb(r4, [r2, 2])  # blue
     bl(send)
+#
+# Draw size single pixels with the color in colorvect, Landscape
+# points holds the x, y coordinates of the pixels in turn, e.g. an array('h').
+# For each pixel the address window and the color is sent, without returning
+# to Python in between.
+#
+@micropython.viper
+def drawPixels_L(points: ptr16, size: int, colorvect: ptr8):
+    gpioa = ptr8(stm.GPIOA + stm.GPIO_ODR)
+    gpiob = ptr16(stm.GPIOB + stm.GPIO_BSRRL)
+    i = 0
+    while size > 0:
+        col = points[i + 0]
+        page = points[i + 1]
+        gpioa[0] = 0x2a         # column address
+        gpiob[1] = D_C | WR     # set C/D and WR low
+        gpiob[0] = D_C | WR     # set C/D and WR high
+        gpioa[0] = col >> 8
+        gpiob[1] = WR           # set WR low. C/D still high
+        gpiob[0] = WR           # set WR high again
+        gpioa[0] = col
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = col >> 8
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = col
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = 0x2b         # page address
+        gpiob[1] = D_C | WR
+        gpiob[0] = D_C | WR
+        gpioa[0] = page >> 8
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = page
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = page >> 8
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = page
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = 0x2c         # memory write
+        gpiob[1] = D_C | WR
+        gpiob[0] = D_C | WR
+        gpioa[0] = colorvect[0] # red
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = colorvect[1] # green
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = colorvect[2] # blue
+        gpiob[1] = WR
+        gpiob[0] = WR
+        i += 2
+        size -= 1
+#
+# drawPixels, Portrait: x and y are exchanged like in setXY_P
+#
+@micropython.viper
+def drawPixels_P(points: ptr16, size: int, colorvect: ptr8):
+    gpioa = ptr8(stm.GPIOA + stm.GPIO_ODR)
+    gpiob = ptr16(stm.GPIOB + stm.GPIO_BSRRL)
+    i = 0
+    while size > 0:
+        col = points[i + 1]
+        page = points[i + 0]
+        gpioa[0] = 0x2a         # column address
+        gpiob[1] = D_C | WR     # set C/D and WR low
+        gpiob[0] = D_C | WR     # set C/D and WR high
+        gpioa[0] = col >> 8
+        gpiob[1] = WR           # set WR low. C/D still high
+        gpiob[0] = WR           # set WR high again
+        gpioa[0] = col
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = col >> 8
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = col
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = 0x2b         # page address
+        gpiob[1] = D_C | WR
+        gpiob[0] = D_C | WR
+        gpioa[0] = page >> 8
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = page
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = page >> 8
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = page
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = 0x2c         # memory write
+        gpiob[1] = D_C | WR
+        gpiob[0] = D_C | WR
+        gpioa[0] = colorvect[0] # red
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = colorvect[1] # green
+        gpiob[1] = WR
+        gpiob[0] = WR
+        gpioa[0] = colorvect[2] # blue
+        gpiob[1] = WR
+        gpiob[0] = WR
+        i += 2
+        size -= 1
 # Assembler version of 
 # Fill screen by writing size pixels with the color given in data
 # data must be 3 bytes of red, green, blue
@@ -0,0 +1,100 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Benchmarks of the drivers, running under CPython on the host simulation.
+#
+# Each benchmark script is run from the repository directory, e.g.
+#
+#   python -m bench.touch_bench -o before.json
+#   ... change the driver ...
+#   python -m bench.touch_bench -o after.json -c before.json
+#
+# and prints its results, optionally stores them as JSON file (-o) and shows
+# the change against the results of a previous run (-c).
+#
+# Simulated times (latency, bus time) follow the virtual clock of sim.clock and
+# are reproducible. Host times (CPU time, calls/s) and heap figures are those
+# of CPython: they are no measure for the board, but show relative changes.
+#
+import sys, os, json, time, tracemalloc
+
+def setup():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if root not in sys.path:
+        sys.path.insert(0, root)
+    import sim
+    sim.install()
+#
+# Host CPU time in µs per call of func(), called n times.
+# With repeat > 1 the best of the repeated runs is taken.
+#
+def cpu_us(func, n, repeat=1):
+    best = None
+    for _ in range(repeat):
+        t = time.process_time()
+        for _ in range(n):
+            func()
+        t = time.process_time() - t
+        best = t if best is None else min(best, t)
+    return best * 1000000 / n
+#
+# Heap use by n calls of func(): returns the tuple (peak bytes, retained blocks)
+# per call, measured with tracemalloc
+#
+def heap_use(func, n):
+    tracemalloc.start()
+    try:
+        func()  # settle lazy allocations
+        blocks = sys.getallocatedblocks()
+        base = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        for _ in range(n):
+            func()
+        peak = tracemalloc.get_traced_memory()[1] - base
+        blocks = sys.getallocatedblocks() - blocks
+    finally:
+        tracemalloc.stop()
+    return max(peak, 0) / n, max(blocks, 0) / n
+
+def report(name, results, argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(prog=name)
+    parser.add_argument("-o", "--output", help="store the results as JSON file")
+    parser.add_argument("-c", "--compare", help="compare with a previous JSON file")
+    args = parser.parse_args(argv)
+    previous = {}
+    if args.compare:
+        with open(args.compare) as f:
+            previous = json.load(f).get("results", {})
+    width = max(len(key) for key in results)
+    for key, value in results.items():
+        line = "%-*s %12.3f" % (width, key, value)
+        old = previous.get(key)
+        if old:
+            line += "  %+7.1f%%" % ((value - old) * 100 / old)
+        print(line)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"benchmark": name, "python": sys.version.split()[0],
+                       "results": results}, f, indent=1, sort_keys=True)
@@ -0,0 +1,126 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+#
+# Benchmark of the hit test of touchtest.get_from_keybd(): the scan of the
+# keytable (scan_*) against touch_keys.KeyIndex (index_*), for a synthetic
+# keypad of KEYS circular and rectangular buttons on an 800 x 480 screen.
+#
+#   python -m bench.keys_bench [-o results.json] [-c previous.json]
+#
+# *_lookup_us: host CPU time per touch, for touches at random positions
+# *_hit_us: host CPU time per touch on the last key of the table
+# index_build_us: time for building the KeyIndex
+# index_max_cell: largest number of keys to test for a touch
+# *_peak_bytes: CPython heap use per touch
+#
+from random import Random
+
+if __name__ == "__main__":
+    from bench import setup
+    setup()
+
+from bench import cpu_us, heap_use, report
+from touch_keys import KeyIndex
+
+KEYS = 120
+TOUCHES = 1000
+
+#
+# KEYS buttons in rows of 15, alternating circles and rectangles
+#
+def keypad(n=KEYS):
+    keytable = []
+    for i in range(n):
+        x = 30 + (i % 15) * 52
+        y = 30 + (i // 15) * 55
+        if i % 2:
+            keytable.append([str(i), "c", (x, y, 24), "f", (0, 255, 0), False, str(i), False])
+        else:
+            keytable.append([str(i), "r", (x - 24, y - 24, x + 24, y + 24), "f", (0, 0, 255), False, str(i), False])
+    return keytable
+#
+# The hit test of get_from_keybd() before KeyIndex
+#
+def scan(keytable, value):
+    for key in keytable:
+        if key[1] == "c":  # circler
+            dx = value[0] - key[2][0]
+            dy = value[1] - key[2][1]
+            if (dx * dx + dy * dy) < (key[2][2] * key[2][2]):  # Pythagoras is alive!
+                return key[0]
+        elif key[1] in ("r", "s"):  # rectangle
+            if key[2][0] <= value[0] <= key[2][2] and key[2][1] <= value[1] <= key[2][3]:
+                return key[0]
+    return None
+
+#
+# Keys reaching beyond the screen edges, and touches off the screen, as given
+# by a calibration near the edge: the index must find what the scan finds.
+#
+def check_edges(rand):
+    keytable = [
+        ["a", "c", (11, 117, 30), "f", False, False, None, False],
+        ["b", "r", (-40, -30, 20, 10), "f", False, False, None, False],
+        ["c", "c", (-20, 300, 15), "f", False, False, None, False],
+        ["d", "r", (-90, 400, -10, 460), "f", False, False, None, False],
+        ["e", "c", (790, 470, 40), "f", False, False, None, False],
+        ["f", "r", (300, -60, 360, -5), "f", False, False, None, False],
+    ] + keypad(30)
+    index = KeyIndex(keytable)
+    for _ in range(20 * TOUCHES):
+        touch = (rand.randint(-150, 950), rand.randint(-150, 630))
+        assert index.lookup(touch) == scan(keytable, touch), touch
+
+def bench_keys(results):
+    keytable = keypad()
+    rand = Random(1)
+    touches = [(rand.randint(0, 799), rand.randint(0, 479)) for _ in range(TOUCHES)]
+    index = KeyIndex(keytable)
+    for touch in touches:
+        assert index.lookup(touch) == scan(keytable, touch)
+    check_edges(rand)
+    last = keytable[-1][2][:2]
+    results["index_build_us"] = cpu_us(lambda: KeyIndex(keytable), 20, 3)
+    results["index_max_cell"] = max(len(cell) for cell in index.cells)
+    pos = [0]
+
+    def next_touch():
+        pos[0] = (pos[0] + 1) % TOUCHES
+        return touches[pos[0]]
+
+    results["scan_lookup_us"] = cpu_us(lambda: scan(keytable, next_touch()), TOUCHES, 5)
+    results["index_lookup_us"] = cpu_us(lambda: index.lookup(next_touch()), TOUCHES, 5)
+    results["scan_hit_us"] = cpu_us(lambda: scan(keytable, last), TOUCHES, 5)
+    results["index_hit_us"] = cpu_us(lambda: index.lookup(last), TOUCHES, 5)
+    results["scan_peak_bytes"] = heap_use(lambda: scan(keytable, last), TOUCHES)[0]
+    results["index_peak_bytes"] = heap_use(lambda: index.lookup(last), TOUCHES)[0]
+
+def main(argv=None):
+    results = {}
+    bench_keys(results)
+    report("keys_bench", results, argv)
+
+if __name__ == "__main__":
+    main()
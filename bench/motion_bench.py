@@ -0,0 +1,158 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+#
+# Benchmark of the tracking of a dragged touch: the MOVE events of
+# XPT2046.events() with the windowed mean of the samples (mean_*) and with the
+# AlphaBeta motion filter (motion_*), against the simulated XPT2046.
+#
+#   python -m bench.motion_bench [-o results.json] [-c previous.json]
+#
+# *_lag_ms: mean distance of the reported position behind the true position
+#     along the direction of the drag, as time at the drag speed (simulated)
+# *_jitter: RMS distance across the direction of the drag in raw units
+# *_error: RMS distance to the true position in raw units
+# *_hold_jitter: RMS distance to the true position while the touch is held still
+# *_cpu_us: host CPU time per event, including the simulation of the device
+# *_flick_down_ms: mean time from the press to the DOWN event of a flick, a
+#     drag moving from the first sample, which is never stable. Each flick must
+#     give DOWN, at least one MOVE and UP.
+#
+from math import hypot, sqrt
+from random import Random
+
+if __name__ == "__main__":
+    from bench import setup
+    setup()
+
+from bench import cpu_us, report
+from sim import clock, machine
+from sim.xpt2046 import XPT2046Sim, Trace
+from touch_queue import DOWN, MOVE, UP
+
+DRAGS = 10
+NOISE = 8   # standard deviation of the raw samples
+BOUNCE = 5  # ms of contact bounce at press and release
+HOLD = 150  # ms the touch is held still before and after the drag
+IDENTITY = (0, 1, 0, 1, 0, 1, 0, 1)  # calibration returning the raw values
+
+#
+# Drags between random points at random speeds, each one pressed and held still
+# before it moves, so the DOWN is given by stable samples
+#
+def drags(n, seed=1):
+    rand = Random(seed)
+    trace = Trace().release(100)
+    for _ in range(n):
+        x, y = rand.randint(300, 3800), rand.randint(300, 3800)
+        x1, y1 = rand.randint(300, 3800), rand.randint(300, 3800)
+        ms = rand.randint(300, 1000)
+        trace.touch(HOLD, x, y, x, y).touch(ms, x, y, x1, y1).touch(HOLD, x1, y1, x1, y1)
+        trace.release(150)
+    return trace
+
+def run_events(motion):
+    from xpt2046_syn import XPT2046
+    clock.reset()
+    irq = machine.Pin("Y5", machine.Pin.IN)
+    trace = drags(DRAGS)
+    spi = XPT2046Sim(trace, noise=NOISE, bounce=BOUNCE, irq=irq)
+    touch = XPT2046(spi=spi, irq=irq, calibration=IDENTITY, motion=motion)
+    events = []
+
+    def run():
+        for kind, x, y, ticks in touch.events(timeout=500):
+            events.append((clock.ticks_us() - spi.t0, x, y))
+
+    cpu = cpu_us(run, 1)
+    return trace, events, cpu / len(events)
+
+def bench_tracking(results, name, motion):
+    trace, events, cpu = run_events(motion)
+    lag = []
+    cross = []
+    error = []
+    hold = []
+    for t, x, y in events:
+        i = trace.find(t)
+        if i < 0 or trace.segments[i][2] is None:
+            continue  # the UP event
+        start, length, x0, y0, x1, y1, rtouch = trace.segments[i]
+        tx, ty, rtouch = trace.position(t)
+        ex, ey = x - tx, y - ty
+        error.append(ex * ex + ey * ey)
+        if x0 == x1 and y0 == y1:
+            hold.append(ex * ex + ey * ey)
+            continue
+        dist = hypot(x1 - x0, y1 - y0)
+        dx, dy = (x1 - x0) / dist, (y1 - y0) / dist
+        speed = dist * 1000 / length  # raw units per ms
+        lag.append(-(ex * dx + ey * dy) / speed)
+        cross.append((ex * dy - ey * dx) ** 2)
+    results["%s_lag_ms" % name] = sum(lag) / len(lag)
+    results["%s_jitter" % name] = sqrt(sum(cross) / len(cross))
+    results["%s_error" % name] = sqrt(sum(error) / len(error))
+    results["%s_hold_jitter" % name] = sqrt(sum(hold) / len(hold))
+    results["%s_cpu_us" % name] = cpu
+
+#
+# Drags moving from the start
+#
+def flicks(n, seed=2):
+    rand = Random(seed)
+    trace = Trace().release(100)
+    for _ in range(n):
+        x, y = rand.randint(300, 3800), rand.randint(300, 3800)
+        x1, y1 = rand.randint(300, 3800), rand.randint(300, 3800)
+        trace.touch(rand.randint(150, 400), x, y, x1, y1).release(150)
+    return trace
+
+def bench_flicks(results, name, motion):
+    from xpt2046_syn import XPT2046
+    clock.reset()
+    irq = machine.Pin("Y5", machine.Pin.IN)
+    trace = flicks(DRAGS)
+    spi = XPT2046Sim(trace, noise=NOISE, bounce=BOUNCE, irq=irq)
+    touch = XPT2046(spi=spi, irq=irq, calibration=IDENTITY, motion=motion)
+    touches = []
+    for kind, x, y, ticks in touch.events(timeout=500):
+        if kind == DOWN:
+            i = trace.find(clock.ticks_us() - spi.t0)
+            touches.append([(clock.ticks_us() - spi.t0 - trace.segments[i][0]) / 1000])
+        touches[-1].append(kind)
+    assert len(touches) == DRAGS, "flicks without DOWN"
+    for kinds in touches:
+        assert kinds[1] == DOWN and MOVE in kinds and kinds[-1] == UP, "flick events %r" % kinds
+    results["%s_flick_down_ms" % name] = sum(t[0] for t in touches) / len(touches)
+
+def main(argv=None):
+    results = {}
+    bench_tracking(results, "mean", False)
+    bench_tracking(results, "motion", True)
+    bench_flicks(results, "mean", False)
+    bench_flicks(results, "motion", True)
+    report("motion_bench", results, argv)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Benchmark of the batch mode of TFT against immediate drawing, on the
+# simulated SSD1963 frame memory. The scene is a keypad like screen: clear,
+# a panel, filled and outlined buttons with frames and a few lines, which is
+# then partly drawn again as after a key press. The update_* scene draws
+# without clearing the screen first: the pressed keys and a list of
+# separate rows, which leaves rows with nothing drawn between equal spans.
+#
+#   python -m bench.tft_bench [-o results.json] [-c previous.json]
+#
+# *_windows: number of setXY() address windows sent to the display
+# *_pixels: number of pixels written to the display
+# *_bus_ms: estimated bus time on the board, as modelled by sim.tft_io
+# *_cpu_ms: host CPU time for drawing the scene
+# *_total_ms: the sum of both. CPU time of the host is no measure for the
+#   board, but batch mode trades bus time for CPU time, so both count.
+# *batch_peak_spans: largest number of spans held by the batch, about 40 bytes each
+# *batch_ops: number of operations recorded in batch mode
+# *batch_flushes: number of flushes, including those by the span budget
+#
+# Both modes must leave the same frame memory content.
+#
+# circle_*: TFT.fillCircle() against the search loop used before (scan_*),
+# for all radii up to RADIUS.
+# ring_*: TFT.drawCircle() against drawing every pixel with drawPixel()
+# (ring_pixel_*), for all radii up to RADIUS.
+# line_*: TFT.drawLine() against drawing every pixel (line_pixel_*), for lines
+# from the centre of the screen in all directions.
+# Per drawing, *_calls is the number of calls of TFT_io functions.
+# The new and the old versions must draw exactly the same pixels.
+#
+import time
+
+if __name__ == "__main__":
+    from bench import setup
+    setup()
+
+from bench import report
+import sim.tft_io
+from sim.tft_io import display
+from tft import TFT
+
+RADIUS = 100
+REPEAT = 5
+
+def scene(tft):
+    tft.clrSCR()
+    tft.fillRectangle(10, 10, 469, 261, (40, 40, 40))
+    for i in range(8):
+        x = 50 + (i % 4) * 110
+        y = 80 + (i // 4) * 110
+        tft.fillCircle(x, y, 40, (0, 160, 0))
+        tft.drawCircle(x, y, 40, (255, 255, 255))
+        tft.fillClippedRectangle(x - 20, y - 12, x + 20, y + 12, (0, 0, 160))
+        tft.drawClippedRectangle(x - 20, y - 12, x + 20, y + 12, (255, 255, 255))
+    for i in range(0, 460, 23):
+        tft.drawLine(10, 10 + i // 2, 469, 261 - i // 2, (255, 255, 0))
+# key press: the button is drawn again in the pressed colors
+    for x, y in ((50, 80), (160, 190)):
+        tft.fillCircle(x, y, 40, (255, 0, 160))
+        tft.drawCircle(x, y, 40, (0, 0, 0))
+        tft.fillClippedRectangle(x - 20, y - 12, x + 20, y + 12, (255, 255, 0))
+
+def update(tft):
+    for x, y in ((50, 80), (160, 190)):
+        tft.fillCircle(x, y, 40, (255, 0, 160))
+        tft.fillClippedRectangle(x - 20, y - 12, x + 20, y + 12, (255, 255, 0))
+    for y in range(10, 262, 9):  # list entries with empty rows between
+        tft.fillRectangle(300, y, 460, y + 3, (0, 0, 160))
+
+def draw_scene(tft, batch, draw, results=None, prefix=None):
+    if batch:
+        tft.begin_batch()
+        stats = tft.batch
+        draw(tft)
+        tft.end_batch()
+        if results is not None:
+            results[prefix + "_ops"] = stats.ops
+            results[prefix + "_flushes"] = stats.flushes
+            results[prefix + "_peak_spans"] = stats.peak
+    else:
+        draw(tft)
+
+def run(tft, batch, results, prefix, draw=scene):
+    cpu = None
+    for _ in range(REPEAT):  # best of REPEAT runs for the CPU time
+        display.reset()
+        tft.set_tft_mode(orientation=tft.orientation)
+        windows, pixels, bus_ns = display.windows, display.pixels, display.bus_ns
+        t = time.process_time()
+        draw_scene(tft, batch, draw, results, prefix)
+        t = time.process_time() - t
+        cpu = t if cpu is None else min(cpu, t)
+    results[prefix + "_cpu_ms"] = cpu * 1000
+    results[prefix + "_windows"] = display.windows - windows
+    results[prefix + "_pixels"] = display.pixels - pixels
+    results[prefix + "_bus_ms"] = (display.bus_ns - bus_ns) / 1000000
+    results[prefix + "_total_ms"] = results[prefix + "_cpu_ms"] + results[prefix + "_bus_ms"]
+    return bytes(display.mem)
+
+#
+# fillCircle() before the span generator, searching the edge of every row
+#
+def scan_circle(tft, x, y, radius, color = None):
+    r_square = radius * radius * 4
+    for y1 in range (-(radius * 2), 1):
+        y_square = y1 * y1
+        for x1 in range (-(radius * 2), 1):
+            if x1*x1+y_square <= r_square:
+                x1i = x1 // 2
+                y1i = y1 // 2
+                tft.drawHLine(x + x1i, y + y1i, 2 * (-x1i), color)
+                tft.drawHLine(x + x1i, y - y1i, 2 * (-x1i), color)
+                break
+
+#
+# drawCircle() and drawLine() before the runs, drawing every single pixel
+#
+def pixel_circle(tft, x, y, radius, color = None):
+    colorvect = bytearray(color)
+    f = 1 - radius
+    ddF_x = 1
+    ddF_y = -2 * radius
+    x1 = 0
+    y1 = radius
+    tft.drawPixel(x, y + radius, colorvect)
+    tft.drawPixel(x, y - radius, colorvect)
+    tft.drawPixel(x + radius, y, colorvect)
+    tft.drawPixel(x - radius, y, colorvect)
+    while x1 < y1:
+        if f >= 0:
+            y1 -= 1
+            ddF_y += 2
+            f += ddF_y
+        x1 += 1
+        ddF_x += 2
+        f += ddF_x
+        for px, py in ((x + x1, y + y1), (x - x1, y + y1), (x + x1, y - y1), (x - x1, y - y1),
+                       (x + y1, y + x1), (x - y1, y + x1), (x + y1, y - x1), (x - y1, y - x1)):
+            tft.drawPixel(px, py, colorvect)
+
+def pixel_line(tft, x1, y1, x2, y2, color = None):
+    if y1 == y2:
+        tft.drawHLine(x1, y1, x2 - x1 + 1, color)
+        return
+    elif x1 == x2:
+        tft.drawVLine(x1, y1, y2 - y1 + 1, color)
+        return
+    colorvect = bytearray(color)
+    dx, xstep  = (x2 - x1, 1) if x2 > x1 else (x1 - x2, -1)
+    dy, ystep  = (y2 - y1, 1) if y2 > y1 else (y1 - y2, -1)
+    col, row = x1, y1
+    if dx < dy:
+        t = - (dy >> 1)
+        while True:
+            tft.drawPixel(col, row, colorvect)
+            if row == y2:
+                return
+            row += ystep
+            t += dx
+            if t >= 0:
+                col += xstep
+                t -= dy
+    else:
+        t = - (dx >> 1)
+        while True:
+            tft.drawPixel(col, row, colorvect)
+            if col == x2:
+                return
+            col += xstep
+            t += dy
+            if t >= 0:
+                row += ystep
+                t -= dx
+#
+# Count the calls of the TFT_io functions by tft
+#
+class Calls:
+
+    def __init__(self, tft):
+        self.n = 0
+        self.tft = tft
+        self.saved = [(tft, name, getattr(tft, name)) for name in ("setXY", "drawPixel", "plotPixels")]
+        self.saved.append((sim.tft_io, "fillSCR_AS", sim.tft_io.fillSCR_AS))
+        for obj, name, func in self.saved:
+            setattr(obj, name, self.counted(func))
+
+    def counted(self, func):
+        def call(*args):
+            self.n += 1
+            return func(*args)
+        return call
+
+    def restore(self):
+        for obj, name, func in self.saved:
+            setattr(obj, name, func)
+#
+# Draw each of cases, the arguments of draw(tft, ...), on a cleared display
+# and return the frames
+#
+def compare(tft, results, prefix, cases, draw):
+    frames = []
+    cpu, windows, pixels, bus_ns, calls = 0, 0, 0, 0, 0
+    for args in cases:
+        display.reset()
+        tft.set_tft_mode(orientation=tft.orientation)
+        w, p, b = display.windows, display.pixels, display.bus_ns
+        t = time.process_time()
+        draw(tft, *args)
+        cpu += time.process_time() - t
+        windows += display.windows - w
+        pixels += display.pixels - p
+        bus_ns += display.bus_ns - b
+        frames.append(bytes(display.mem))
+        counter = Calls(tft)
+        draw(tft, *args)
+        counter.restore()
+        calls += counter.n
+    n = len(cases)
+    results[prefix + "_cpu_us"] = cpu * 1000000 / n
+    results[prefix + "_calls"] = calls / n
+    results[prefix + "_windows"] = windows / n
+    results[prefix + "_pixels"] = pixels / n
+    results[prefix + "_bus_us"] = bus_ns / 1000 / n
+    return frames
+
+def bench_shapes(tft, results):
+    white = (255, 255, 255)
+    circles = [(240, 136, radius, white) for radius in range(RADIUS + 1)]
+    assert (compare(tft, results, "circle", circles, TFT.fillCircle) ==
+            compare(tft, results, "scan", circles, scan_circle)), "fillCircle differs"
+    assert (compare(tft, results, "ring", circles, TFT.drawCircle) ==
+            compare(tft, results, "ring_pixel", circles, pixel_circle)), "drawCircle differs"
+    ends = ([(x, 6) for x in range(40, 441, 20)] + [(x, 266) for x in range(40, 441, 20)] +
+            [(40, y) for y in range(26, 266, 20)] + [(440, y) for y in range(26, 266, 20)])
+    lines = [(240, 136, x, y, white) for x, y in ends]
+    assert (compare(tft, results, "line", lines, TFT.drawLine) ==
+            compare(tft, results, "line_pixel", lines, pixel_line)), "drawLine differs"
+
+def main(argv=None):
+    results = {}
+    tft = TFT("SSD1963", "LB04301")
+    frame = run(tft, False, results, "immediate")
+    assert run(tft, True, results, "batch") == frame, "batch mode frame differs"
+    frame = run(tft, False, results, "update_immediate", update)
+    assert run(tft, True, results, "update_batch", update) == frame, "batch mode update differs"
+    bench_shapes(tft, results)
+    report("tft_bench", results, argv)
+
+if __name__ == "__main__":
+    main()
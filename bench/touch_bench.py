@@ -0,0 +1,175 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Benchmark of the touch path: get_touch(), also in adaptive mode and with the
+# filter modes or oversampling on samples with outliers (glitch_*, oversample_*),
+# raw_touch(), do_normalize() and the asynchronous loop of TOUCH, against the
+# simulated XPT2046.
+#
+#   python -m bench.touch_bench [-o results.json] [-c previous.json]
+#
+# latency_*: time from touch-down to the report of a stable touch (simulated)
+# bus_us_per_sample: SPI time of a single raw sample at 1 MHz (simulated)
+# *_cpu_us, *_per_s: host CPU time, including the simulation of the devices
+# *_peak_bytes, *_blocks: CPython heap use per call
+#
+from random import Random
+
+if __name__ == "__main__":
+    from bench import setup
+    setup()
+
+from bench import cpu_us, heap_use, report
+from sim import clock, machine
+from sim.xpt2046 import XPT2046Sim, Trace
+
+TAPS = 20
+NOISE = 8   # standard deviation of the raw samples
+BOUNCE = 5  # ms of contact bounce at press and release
+TIMEOUT = 500  # ms to wait for a touch
+GLITCH = 0.05  # probability of an outlier sample, for the filter mode test
+
+def taps(n, seed=1):
+    rand = Random(seed)
+    trace = Trace().release(100)
+    for _ in range(n):
+        trace.tap(rand.randint(300, 3800), rand.randint(300, 3800), hold=200, pause=150)
+    return trace
+#
+# Time of the touch-down preceding the report at time now
+#
+def press_time(spi, now):
+    return max(spi.t0 + seg[0] for seg in spi.trace.segments
+               if seg[2] is not None and spi.t0 + seg[0] <= now)
+
+def new_touch(trace, glitch=0, **kwargs):
+    from xpt2046_syn import XPT2046
+    clock.reset()
+    irq = machine.Pin("Y5", machine.Pin.IN)
+    spi = XPT2046Sim(trace, noise=NOISE, bounce=BOUNCE, glitch=glitch, irq=irq)
+    return XPT2046(spi=spi, irq=irq, **kwargs), spi
+
+#
+# Run get_touch() for all taps of the trace, returning the latencies in µs
+# and the CPU time in µs
+#
+def run_get_touch(touch, spi):
+    latency = []
+
+    def get_touch():
+        if touch.get_touch(timeout=TIMEOUT) is not None:
+            now = clock.ticks_us()
+            latency.append(now - press_time(spi, now))
+
+    cpu = cpu_us(get_touch, TAPS) * TAPS
+    return latency, cpu
+
+def bench_get_touch(results):
+    latency, cpu = run_get_touch(*new_touch(taps(TAPS)))
+    results["missed"] = TAPS - len(latency)
+    results["latency_ms"] = sum(latency) / len(latency) / 1000
+    results["latency_max_ms"] = max(latency) / 1000
+    results["get_touch_cpu_us"] = cpu / len(latency)
+    touch, spi = new_touch(taps(TAPS + 1))
+    results["get_touch_peak_bytes"], results["get_touch_blocks"] = heap_use(
+        lambda: touch.get_touch(timeout=TIMEOUT), TAPS)
+
+def bench_adaptive(results):
+    latency, cpu = run_get_touch(*new_touch(taps(TAPS), adaptive=True))
+    latency.sort()
+    results["adaptive_missed"] = TAPS - len(latency)
+    results["adaptive_latency_ms"] = sum(latency) / len(latency) / 1000
+    results["adaptive_latency_median_ms"] = latency[len(latency) // 2] / 1000
+    results["adaptive_latency_max_ms"] = latency[-1] / 1000
+
+def bench_filter_modes(results):
+    from touch_filter import MEAN, MEDIAN, TRIMMED
+    for name, mode in (("mean", MEAN), ("median", MEDIAN), ("trimmed", TRIMMED)):
+        latency, cpu = run_get_touch(*new_touch(taps(TAPS), GLITCH, filter_mode=mode))
+        results["glitch_%s_missed" % name] = TAPS - len(latency)
+        results["glitch_%s_latency_ms" % name] = sum(latency) / len(latency) / 1000
+        results["glitch_%s_cpu_us" % name] = cpu / len(latency)
+
+def bench_oversample(results):
+    touch, spi = new_touch(taps(TAPS), GLITCH, oversample=5, confidence=3)
+    latency, cpu = run_get_touch(touch, spi)
+    results["oversample_missed"] = TAPS - len(latency)
+    results["oversample_latency_ms"] = sum(latency) / len(latency) / 1000
+    results["oversample_bus_us_per_sample"] = spi.bus_us / spi.transfers
+
+def bench_raw_touch(results):
+    touch, spi = new_touch(Trace().touch(3600000, 2000, 2000))
+    n = 2000
+    us = cpu_us(touch.raw_touch, n, 5)
+    results["raw_touch_per_s"] = 1000000 / us
+    results["bus_us_per_sample"] = spi.bus_us / spi.transfers
+    results["raw_touch_peak_bytes"], results["raw_touch_blocks"] = heap_use(touch.raw_touch, n)
+    sample = touch.sample
+    results["raw_touch_into_peak_bytes"], results["raw_touch_into_blocks"] = heap_use(
+        lambda: touch.raw_touch_into(sample), n)
+
+def bench_normalize(results):
+    touch, spi = new_touch(Trace())
+    point = (2000, 2000)
+    results["do_normalize_per_s"] = 1000000 / cpu_us(lambda: touch.do_normalize(point), 20000, 5)
+
+def bench_async(results):
+    import uasyncio as asyncio
+    from touch import TOUCH
+    clock.reset()
+    irq = machine.Pin("Y5", machine.Pin.IN)
+    spi = XPT2046Sim(taps(TAPS), noise=NOISE, bounce=BOUNCE, irq=irq)
+    touch = TOUCH("XPT2046", True, spi=spi, irq=irq)
+    latency = []
+
+    async def main():
+        for _ in range(TAPS):
+            try:
+                await asyncio.wait_for_ms(touch.touch(), TIMEOUT)
+            except asyncio.TimeoutError:
+                continue
+            latency.append(clock.ticks_us() - press_time(spi, clock.ticks_us()))
+            while touch.touched:  # wait for the release
+                await asyncio.sleep_ms(10)
+
+    cpu = cpu_us(lambda: asyncio.run(main()), 1)
+    results["async_missed"] = TAPS - len(latency)
+    results["async_latency_ms"] = sum(latency) / len(latency) / 1000
+    results["async_latency_max_ms"] = max(latency) / 1000
+    results["async_cpu_us"] = cpu / len(latency)
+    results["async_bus_us_per_touch"] = spi.bus_us / TAPS
+
+def main(argv=None):
+    results = {}
+    bench_get_touch(results)
+    bench_adaptive(results)
+    bench_filter_modes(results)
+    bench_oversample(results)
+    bench_raw_touch(results)
+    bench_normalize(results)
+    bench_async(results)
+    report("touch_bench", results, argv)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+#
+# Timing of the transports of touch_bytecode.py: time per read_batch() of
+# X, Y, Z1 and Z2 and per conversion, and the values read, for comparison.
+#
+import pyb
+from touch_bytecode import TOUCH, BitBangTransport, ViperTransport, AsmTransport
+
+def main(n=100):
+    for transport in (BitBangTransport(), ViperTransport(), AsmTransport()):
+        mytouch = TOUCH("XPT2046", transport=transport)
+        start = pyb.micros()
+        for _ in range(n):
+            xyz = mytouch.read_batch()
+        us = pyb.elapsed_micros(start) / n
+        print("%-16s %7.1f us per sample, %6.1f us per conversion, X Y Z1 Z2 = %d %d %d %d" %
+              (type(transport).__name__, us, us / 4, xyz[0], xyz[1], xyz[2], xyz[3]))
+
+main()
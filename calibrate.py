@@ -5,6 +5,7 @@ import os, gc
 from uctypes import addressof
 from tft import *
 from touch import *
+from touch_cal import solve
 from font8mono import font8mono
 
 #
@@ -29,55 +30,54 @@ def draw_crosshair(tft, x, y):
     tft.drawVLine(x, y - 10, 20)
     tft.setColor(color) # restore color
 
-def main(get_cal = False):
+#
+# Points to be touched for the calibration, as fraction of the screen size,
+# and their names. More points give a better least squares fit.
+#
+CAL_POINTS = (
+    (0, 0, "upper left corner"),
+    (1, 0, "upper right corner"),
+    (0, 1, "lower left corner"),
+    (1, 1, "lower right corner"),
+    (0.5, 0.5, "centre"),
+)
+
+def main(get_cal = False, perspective = False, orientation = LANDSCAPE):
 
-    mytft = TFT("SSD1963", "LB04301", LANDSCAPE)
+    mytft = TFT("SSD1963", "LB04301", orientation)
     width, height = mytft.getScreensize()
     mytouch = TOUCH("XPT2046")
     mytft.backlight(100) # light on
+    xc, yc = width // 2, height // 2
 
     if get_cal:
         mytft.setTextStyle(None, None, 0, font8mono)
         mytouch.touch_parameter(confidence=20, margin = 40) # make it slow & precise
-        print_centered(mytft, 240, 136, "Touch the crosshair in the upper left corner", font8mono)
-        draw_crosshair(mytft, 10, 10)
-        x1, y1 = mytouch.get_touch(raw = True) # need the raw values here
-
-        mytft.clrSCR()
-        print_centered(mytft, 240, 136, "Touch the crosshair in the upper right corner", font8mono)
-        draw_crosshair(mytft, width - 11, 10)
-        x2, y2 = mytouch.get_touch(raw = True) # need the raw values here
+        raw = []
+        screen = []
+        for fx, fy, name in CAL_POINTS:
+            x = 10 + int(fx * (width - 21))
+            y = 10 + int(fy * (height - 21))
+            mytft.clrSCR()
+            print_centered(mytft, xc, yc - 32, "Touch the crosshair in the " + name, font8mono)
+            draw_crosshair(mytft, x, y)
+            raw.append(mytouch.get_touch(raw = True)) # need the raw values here
+            screen.append((x, y))
 
         mytft.clrSCR()
-        print_centered(mytft, 240, 136, "Touch the crosshair in the lower left corner", font8mono)
-        draw_crosshair(mytft, 10, height - 11)
-        x3, y3 = mytouch.get_touch(raw = True) # need the raw values here
-
-        mytft.clrSCR()
-        print_centered(mytft, 240, 136, "Touch the crosshair in the lower right corner", font8mono)
-        draw_crosshair(mytft, width - 11, height - 11)
-        x4, y4 = mytouch.get_touch(raw = True) # need the raw values here
-
-        mytft.clrSCR()
-        xmul_top = (width - 20) / (x2 - x1)
-        xadd_top = int(-x1 + 10 / xmul_top)
-        xmul_bot = (width - 20) / (x4 - x3)
-        xadd_bot = int(-x3 + 10 / xmul_bot)
-        ymul_left = (height - 20) / (y3 - y1)
-        yadd_left = int(-y1 + 10 / ymul_left)
-        ymul_right = (height - 20) / (y4 - y2)
-        yadd_right = int(-y2 + 10 / ymul_right)
-        res = "({},{:6.4},{},{:6.4},{},{:6.4},{},{:6.4})".format(
-                xadd_top, xmul_top, xadd_bot, xmul_bot, yadd_left, ymul_left, yadd_right, ymul_right)
+        cal = solve(raw, screen, perspective)
+        res = repr(cal)
         mytft.setColor((255,255,255))
-        print_centered(mytft, 240, 120, "Calibration =", font8mono)
-        print_centered(mytft, 240, 136, res, font8mono)
+        print_centered(mytft, xc, yc - 16, "Calibration =", font8mono)
+        print_centered(mytft, xc, yc, res, font8mono)
         print ("Calibration =", res)
-        mytouch.touch_parameter(confidence = 5, margin = 20, 
-            calibration = (xadd_top, xmul_top, xadd_bot, xmul_bot, yadd_left, ymul_left, yadd_right, ymul_right))
-        print_centered(mytft, 240, 152, "Now you may touch for testing", font8mono)
+        for (x, y), r in zip(screen, cal.residuals):
+            print ("Point ({}, {}): error {:.1f} pixel".format(x, y, r))
+        print_centered(mytft, xc, yc + 16, "RMS error {:.1f} pixel".format(cal.rms), font8mono)
+        mytouch.touch_parameter(confidence = 5, margin = 20, calibration = cal)
+        print_centered(mytft, xc, yc + 32, "Now you may touch for testing", font8mono)
     else:
-        print_centered(mytft, 240, 136, "Please touch me!", font8mono)
+        print_centered(mytft, xc, yc, "Please touch me!", font8mono)
     mytft.setColor((0, 255, 0))  # green as can be
     while True:
         res = mytouch.get_touch()
@@ -85,4 +85,3 @@ def main(get_cal = False):
             mytft.fillCircle(res[0], res[1], 5)
     
 main(True)
-
@@ -0,0 +1,57 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Host side simulation of the MicroPython environment used by the drivers
+#
+# Usage, before importing any driver module under CPython:
+#
+#   import sim
+#   sim.install()
+#
+# install() provides const() and stand-ins for the MicroPython modules machine,
+# pyb, stm, uctypes and uasyncio, the MicroPython specific functions of the
+# time module, which run on the virtual clock of sim.clock, and TFT_io, which
+# draws into the frame memory model of sim.tft_io.
+#
+# Touch input is simulated by an XPT2046Sim object of sim.xpt2046, which is
+# passed as spi object to the touch drivers:
+#
+#   from sim.xpt2046 import XPT2046Sim, Trace
+#   from xpt2046_syn import XPT2046
+#   touch = XPT2046(spi=XPT2046Sim(Trace().tap(2000, 2000), noise=5))
+#
+import sys
+
+def install():
+    import builtins, time
+    builtins.const = lambda x: x
+    from sim import clock, machine, pyb, stm, uctypes, uasyncio, tft_io
+    sys.modules["machine"] = machine
+    sys.modules["pyb"] = pyb
+    sys.modules["stm"] = stm
+    sys.modules["uctypes"] = uctypes
+    sys.modules["uasyncio"] = uasyncio
+    sys.modules["TFT_io"] = tft_io
+    for name in ("ticks_ms", "ticks_us", "ticks_diff", "ticks_add",
+                 "sleep_ms", "sleep_us"):
+        setattr(time, name, getattr(clock, name))
@@ -0,0 +1,109 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Virtual time base of the host simulation.
+#
+# Time only advances when the code under test sleeps, so runs are fast and
+# reproducible. Objects which depend on time (timers, scripted touch traces)
+# register a callback with add_listener(), which is called on every advance.
+# Time advanced by a listener, e.g. by a simulated SPI transfer in a timer
+# callback, is added to the running advance.
+#
+
+_now_us = 0
+_listeners = []
+_busy = False
+_debt = 0
+
+def ticks_us():
+    return _now_us
+
+def ticks_ms():
+    return _now_us // 1000
+
+def ticks_diff(a, b):
+    return a - b
+
+def ticks_add(a, b):
+    return a + b
+
+def advance_us(us):
+    global _now_us, _busy, _debt
+    if _busy:  # called by a listener, e.g. a timer callback doing SPI transfers
+        _debt += us
+        return
+    _busy = True
+    try:
+        target = _now_us + us
+        while True:
+            step = target
+            for listener in _listeners:  # stop at the next event of a listener
+                due = listener.next_event(_now_us)
+                if due is not None and _now_us < due < step:
+                    step = due
+            _now_us = step
+            for listener in list(_listeners):  # listeners may remove themselves
+                listener.update(_now_us)
+            target += _debt  # time consumed by the listeners
+            _debt = 0
+            if step == target:
+                break
+    finally:
+        _busy = False
+
+def sleep_us(us):
+    advance_us(us)
+
+def sleep_ms(ms):
+    advance_us(ms * 1000)
+
+def sleep(s):
+    advance_us(int(s * 1000000))
+#
+# A listener must provide next_event(now), returning the time in µs of its
+# next state change or None, and update(now), which is called after time advanced.
+#
+def add_listener(listener):
+    if listener not in _listeners:
+        _listeners.append(listener)
+
+def remove_listener(listener):
+    if listener in _listeners:
+        _listeners.remove(listener)
+
+#
+# Time of the next state change of any listener, or None
+#
+def next_event():
+    due = None
+    for listener in _listeners:
+        t = listener.next_event(_now_us)
+        if t is not None and t > _now_us and (due is None or t < due):
+            due = t
+    return due
+
+def reset():
+    global _now_us, _debt
+    _now_us = 0
+    _debt = 0
+    del _listeners[:]
@@ -0,0 +1,140 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Stand-in for the parts of the machine module used by the drivers.
+#
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    PULL_DOWN = 2
+    IRQ_FALLING = 1
+    IRQ_RISING = 2
+
+    def __init__(self, id=None, mode=IN, pull=None, value=None):
+        self.id = id
+        self._value = 1 if value is None else value
+        self._handler = None
+        self._trigger = 0
+        self.init(mode, pull)
+
+    def init(self, mode=IN, pull=None, value=None):
+        self.mode = mode
+        self.pull = pull
+        if value is not None:
+            self._value = value
+#
+# Read or set the pin level as seen by the program
+#
+    def value(self, v=None):
+        if v is None:
+            return self._value
+        self._value = 1 if v else 0
+
+    __call__ = value
+
+    def on(self):
+        self._value = 1
+
+    def off(self):
+        self._value = 0
+
+    def irq(self, handler=None, trigger=IRQ_FALLING | IRQ_RISING):
+        self._handler = handler
+        self._trigger = trigger
+#
+# Change the level from the outside, like a connected device would do.
+# Calls the irq handler on a matching edge.
+#
+    def drive(self, v):
+        v = 1 if v else 0
+        old = self._value
+        self._value = v
+        if self._handler is not None and v != old:
+            if (v == 0 and self._trigger & Pin.IRQ_FALLING or
+                v == 1 and self._trigger & Pin.IRQ_RISING):
+                self._handler(self)
+#
+# SPI bus without any device attached: all reads return 0
+#
+class SPI:
+
+    def __init__(self, id=-1, *args, **kwargs):
+        self.id = id
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def write(self, buf):
+        pass
+
+    def readinto(self, buf, write=0):
+        for i in range(len(buf)):
+            buf[i] = 0
+
+    def write_readinto(self, write_buf, read_buf):
+        self.readinto(read_buf)
+#
+# Periodic or one-shot timer running on the virtual clock. The callback is
+# called while the clock advances, e.g. in time.sleep_ms().
+#
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    def __init__(self, id=-1, **kwargs):
+        self.id = id
+        self._callback = None
+        self._due = None
+        if kwargs:
+            self.init(**kwargs)
+
+    def init(self, mode=PERIODIC, freq=None, period=None, callback=None):
+        from sim import clock
+        if freq is not None:
+            self._period = 1000000 // freq
+        else:
+            self._period = (1000 if period is None else period) * 1000
+        self._mode = mode
+        self._callback = callback
+        self._due = clock.ticks_us() + self._period
+        clock.add_listener(self)
+
+    def deinit(self):
+        from sim import clock
+        self._due = None
+        clock.remove_listener(self)
+
+    def next_event(self, now):
+        return self._due
+
+    def update(self, now):
+        while self._due is not None and self._due <= now:
+            if self._mode == Timer.PERIODIC:
+                self._due += self._period
+            else:
+                self.deinit()
+            if self._callback is not None:
+                self._callback(self)
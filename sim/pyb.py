@@ -0,0 +1,77 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Stand-in for the parts of the pyb module used by the drivers.
+#
+from sim import clock, machine
+
+def delay(ms):
+    clock.sleep_ms(ms)
+
+def udelay(us):
+    clock.sleep_us(us)
+
+def millis():
+    return clock.ticks_ms()
+
+def micros():
+    return clock.ticks_us()
+
+class Pin(machine.Pin):
+    OUT_PP = 1
+    OUT_OD = 2
+    PULL_NONE = None
+#
+# Timer with PWM channels. Only the channel setting is kept.
+#
+class Timer:
+    PWM = 0
+
+    def __init__(self, id, **kwargs):
+        self.id = id
+        self.kwargs = kwargs
+        self.channels = {}
+
+    def init(self, **kwargs):
+        self.kwargs = kwargs
+
+    def deinit(self):
+        pass
+
+    def channel(self, ch, mode=None, **kwargs):
+        if mode is not None:
+            self.channels[ch] = _Channel(mode, kwargs)
+        return self.channels[ch]
+
+class _Channel:
+
+    def __init__(self, mode, kwargs):
+        self.mode = mode
+        self.kwargs = kwargs
+        self.percent = 0
+
+    def pulse_width_percent(self, percent=None):
+        if percent is None:
+            return self.percent
+        self.percent = percent
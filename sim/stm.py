@@ -0,0 +1,69 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Stand-in for the stm module. The register addresses are defined, which the
+# drivers use for setting up pointers. Direct register access (stm.mem16 etc.)
+# is passed to simulated devices at GPIO ports, see attach(). Pointers of
+# viper and asm_thumb code are not simulated.
+#
+GPIOA = 0x40020000
+GPIOB = 0x40020400
+GPIOC = 0x40020800
+GPIO_MODER = 0x00
+GPIO_IDR = 0x10
+GPIO_ODR = 0x14
+GPIO_BSRRL = 0x18
+GPIO_BSRRH = 0x1a
+#
+# Register access through mem8, mem16 and mem32 reaches the device models
+# attached to a port with attach(). A model has the methods read(offset) and
+# write(offset, value) for 16 bit registers. Other addresses read 0.
+#
+_ports = {}
+
+def attach(port, model):
+    _ports[port] = model
+
+def detach(port):
+    _ports.pop(port, None)
+
+class _Memory:
+
+    def __init__(self, size):
+        self.size = size
+
+    def __getitem__(self, addr):
+        model = _ports.get(addr & ~0x3ff)
+        if model is None:
+            return 0
+        return model.read(addr & 0x3ff) & ((1 << self.size) - 1)
+
+    def __setitem__(self, addr, value):
+        model = _ports.get(addr & ~0x3ff)
+        if model is not None:
+            model.write(addr & 0x3ff, value & ((1 << self.size) - 1))
+
+mem8 = _Memory(8)
+mem16 = _Memory(16)
+mem32 = _Memory(32)
@@ -0,0 +1,361 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Stand-in for TFT_io, the low level drivers of the parallel SSD1963 interface.
+#
+# The functions feed a model of the SSD1963 frame memory instead of the GPIO
+# ports: column and page address windows, memory write and read with the
+# row/column exchange bit of the address mode, and the frame memory with
+# 3 bytes per pixel in the order they are sent. Logical screen coordinates,
+# as used by the TFT class, are accessed with display.pixel(x, y).
+#
+# Each call also adds its estimated bus time, taken from the speeds noted in
+# TFT_io.py, to the virtual clock, if timing is True.
+#
+from sim import clock
+from sim.uctypes import resolve
+
+timing = True
+
+class SSD1963Sim:
+
+    def __init__(self, width=480, height=272):
+        self.reset(width, height)
+
+    def reset(self, width=480, height=272):
+        self.width = width      # physical columns
+        self.height = height    # physical pages
+        self.mem = bytearray(width * height * 3)
+        self.madctl = 0
+        self.col_start, self.col_end = 0, width - 1
+        self.page_start, self.page_end = 0, height - 1
+        self.col, self.page = 0, 0
+        self.cmd = 0
+        self.params = bytearray()
+        self.partial = bytearray()  # incomplete pixel of a byte wise write
+        self.scroll_area = (0, height, 0)
+        self.scroll_start = 0
+        self.commands = 0
+        self.windows = 0
+        self.pixels = 0
+        self.bus_ns = 0
+        self._ns = 0
+#
+# Logical screen coordinates: in portrait mode (row/column exchange)
+# x runs along the pages and y along the columns.
+#
+    def portrait(self):
+        return bool(self.madctl & 0x20)
+
+    def size(self):
+        if self.portrait():
+            return self.height, self.width
+        return self.width, self.height
+
+    def pixel(self, x, y):
+        if self.portrait():
+            x, y = y, x
+        i = (y * self.width + x) * 3
+        return tuple(self.mem[i:i + 3])
+#
+# Count the pixels of a color in the area x1, y1, x2, y2 (inclusive)
+#
+    def count(self, color, x1=0, y1=0, x2=None, y2=None):
+        w, h = self.size()
+        x2 = w - 1 if x2 is None else x2
+        y2 = h - 1 if y2 is None else y2
+        color = tuple(color)
+        return sum(1 for y in range(y1, y2 + 1) for x in range(x1, x2 + 1)
+                   if self.pixel(x, y) == color)
+#
+# Write the logical screen as binary PPM file
+#
+    def save_ppm(self, filename):
+        w, h = self.size()
+        with open(filename, "wb") as f:
+            f.write(b"P6 %d %d 255\n" % (w, h))
+            if not self.portrait():
+                f.write(self.mem)
+            else:
+                for y in range(h):
+                    f.write(b"".join(bytes(self.pixel(x, y)) for x in range(w)))
+#
+# Controller interface: commands and data
+#
+    def command(self, cmd):
+        self.commands += 1
+        self.cmd = cmd
+        self.params = bytearray()
+        self.partial = bytearray()
+        if cmd == 0x2c or cmd == 0x2e:  # memory write/read start
+            self.col, self.page = self.col_start, self.page_start
+            self.windows += cmd == 0x2c
+        elif cmd == 0x01:  # software reset
+            self.madctl = 0
+
+    def data(self, data, n=None):
+        n = len(data) if n is None else n
+        if self.cmd == 0x2c or self.cmd == 0x3c:
+            if self.partial:
+                data = self.partial + bytes(data[:n])
+                n = len(data)
+            full = n - n % 3
+            self.write_pixels(data[:full])
+            self.partial = bytearray(data[full:n])
+            return
+        self.params += bytes(data[:n])
+        p = self.params
+        cmd = self.cmd
+        if cmd == 0x2a and len(p) >= 4:
+            self.col_start = min(p[0] << 8 | p[1], self.width - 1)
+            self.col_end = min(max(p[2] << 8 | p[3], self.col_start), self.width - 1)
+        elif cmd == 0x2b and len(p) >= 4:
+            self.page_start = min(p[0] << 8 | p[1], self.height - 1)
+            self.page_end = min(max(p[2] << 8 | p[3], self.page_start), self.height - 1)
+        elif cmd == 0x36 and len(p) >= 1:
+            self.madctl = p[0]
+        elif cmd == 0xb0 and len(p) >= 6:
+            width = (p[2] << 8 | p[3]) + 1
+            height = (p[4] << 8 | p[5]) + 1
+            if (width, height) != (self.width, self.height):
+                madctl = self.madctl
+                commands = self.commands
+                self.reset(width, height)
+                self.madctl, self.commands = madctl, commands
+        elif cmd == 0x33 and len(p) >= 6:
+            self.scroll_area = (p[0] << 8 | p[1], p[2] << 8 | p[3], p[4] << 8 | p[5])
+        elif cmd == 0x37 and len(p) >= 2:
+            self.scroll_start = p[0] << 8 | p[1]
+#
+# Write pixel data, 3 bytes each, into the window at the memory pointer.
+# The column address increments first, or the page address with the
+# row/column exchange bit set.
+#
+    def write_pixels(self, data):
+        mem = self.mem
+        width = self.width
+        n = len(data) // 3
+        self.pixels += n
+        i = 0
+        while n > 0:
+            base = (self.page * width + self.col) * 3
+            if not self.madctl & 0x20:
+                run = min(n, self.col_end - self.col + 1)
+                mem[base:base + 3 * run] = data[i:i + 3 * run]
+                self.col += run
+            else:
+                run = min(n, self.page_end - self.page + 1)
+                step = width * 3
+                for k in range(3):
+                    mem[base + k:base + k + step * run:step] = data[i + k:i + 3 * run:3]
+                self.page += run
+            self._advance()
+            i += 3 * run
+            n -= run
+
+    def read_pixels(self, buf, n):
+        mem = self.mem
+        for i in range(0, n - n % 3, 3):
+            base = (self.page * self.width + self.col) * 3
+            buf[i:i + 3] = mem[base:base + 3]
+            if not self.madctl & 0x20:
+                self.col += 1
+            else:
+                self.page += 1
+            self._advance()
+
+    def _advance(self):
+        if self.col > self.col_end:
+            self.col = self.col_start
+            self.page += 1
+            if self.page > self.page_end:
+                self.page = self.page_start
+        elif self.page > self.page_end:
+            self.page = self.page_start
+            self.col += 1
+            if self.col > self.col_end:
+                self.col = self.col_start
+
+    def set_window(self, c1, p1, c2, p2):
+        self.command(0x2a)
+        self.data(bytes([c1 >> 8 & 0xff, c1 & 0xff, c2 >> 8 & 0xff, c2 & 0xff]))
+        self.command(0x2b)
+        self.data(bytes([p1 >> 8 & 0xff, p1 & 0xff, p2 >> 8 & 0xff, p2 & 0xff]))
+        self.command(0x2c)
+
+    def bus_time(self, ns):
+        self.bus_ns += ns
+        if timing:
+            self._ns += ns
+            if self._ns >= 1000:
+                us = self._ns // 1000
+                self._ns -= us * 1000
+                clock.advance_us(us)
+
+display = SSD1963Sim()
+
+def _buffer(ptr, n):
+    buf, offset = resolve(ptr)
+    return memoryview(buf)[offset:offset + n] if n is not None else memoryview(buf)[offset:]
+#
+# The TFT_io functions
+#
+def setXY_L(x1, y1, x2, y2):
+    display.set_window(x1, y1, x2, y2)
+    display.bus_time(6000)
+
+def setXY_P(x1, y1, x2, y2):
+    display.set_window(y1, x1, y2, x2)
+    display.bus_time(6000)
+
+def drawPixel_L(x, y, colorvect):
+    display.set_window(x, y, x, y)
+    display.data(_buffer(colorvect, 3))
+    display.bus_time(7000)
+
+def drawPixel_P(x, y, colorvect):
+    display.set_window(y, x, y, x)
+    display.data(_buffer(colorvect, 3))
+    display.bus_time(7000)
+
+def _points(points, size):
+    buf, offset = resolve(points)
+    return memoryview(buf).cast("B")[offset:].cast("H")[:2 * size]
+
+def drawPixels_L(points, size, colorvect):
+    points = _points(points, size)
+    color = _buffer(colorvect, 3)
+    for i in range(0, 2 * size, 2):
+        display.set_window(points[i], points[i + 1], points[i], points[i + 1])
+        display.data(color)
+    display.bus_time(2000 * size)
+
+def drawPixels_P(points, size, colorvect):
+    points = _points(points, size)
+    color = _buffer(colorvect, 3)
+    for i in range(0, 2 * size, 2):
+        display.set_window(points[i + 1], points[i], points[i + 1], points[i])
+        display.data(color)
+    display.bus_time(2000 * size)
+
+def fillSCR_AS(data, size):
+    if size > 0:
+        display.data(bytes(_buffer(data, 3)) * size)
+        display.bus_time(214 * size)
+
+def displaySCR_AS(data, size):  # data is blue-green-red
+    buf = _buffer(data, 3 * size)
+    out = bytearray(3 * size)
+    out[0::3] = buf[2::3]
+    out[1::3] = buf[1::3]
+    out[2::3] = buf[0::3]
+    display.data(out)
+    display.bus_time(266 * size)
+
+def displaySCR565_AS(data, size):
+    buf = _buffer(data, 2 * size)
+    out = bytearray(3 * size)
+    for i in range(size):
+        lo, hi = buf[2 * i], buf[2 * i + 1]
+        out[3 * i] = hi & 0xf8
+        out[3 * i + 1] = (hi << 5 | lo >> 3) & 0xfc
+        out[3 * i + 2] = lo << 3 & 0xff
+    display.data(out)
+    display.bus_time(266 * size)
+
+def displaySCR_charbitmap(bits, size, control, bg_buf):
+    bits = _buffer(bits, (size + 7) // 8)
+    control = _buffer(control, 7)
+    transparency = control[6]
+    fg = bytes(control[3:6])
+    bg = bytes(control[0:3])
+    out = bytearray(3 * size)
+    for i in range(size):
+        j = 3 * i
+        if bits[i >> 3] & (0x80 >> (i & 7)):
+            if transparency & 8:  # invert background as foreground
+                out[j:j + 3] = bytes(255 - v for v in bg_buf[j:j + 3])
+            else:
+                out[j:j + 3] = fg
+        elif transparency & 1:  # dim background
+            out[j:j + 3] = bytes(v >> 1 for v in bg_buf[j:j + 3])
+        elif transparency & 2:  # keep background
+            out[j:j + 3] = bg_buf[j:j + 3]
+        elif transparency & 4:  # invert background
+            out[j:j + 3] = bytes(255 - v for v in bg_buf[j:j + 3])
+        else:
+            out[j:j + 3] = bg
+    display.data(out)
+    display.bus_time(400 * size)
+
+def displaySCR_bmp(data, size, bits, colortable):
+    data = _buffer(data, (size * bits + 7) // 8)
+    colortable = _buffer(colortable, None)
+    out = bytearray(3 * size)
+    per_byte = 8 // bits
+    mask = (1 << bits) - 1
+    for i in range(size):
+        shift = 8 - bits * (i % per_byte + 1)
+        offset = ((data[i // per_byte] >> shift) & mask) * 4
+        out[3 * i] = colortable[offset + 2]
+        out[3 * i + 1] = colortable[offset + 1]
+        out[3 * i + 2] = colortable[offset]
+    display.data(out)
+    display.bus_time(400 * size)
+
+def tft_cmd_data(cmd, data, size):
+    display.command(cmd)
+    display.data(_buffer(data, size))
+    display.bus_time(300 * (size + 1))
+
+def tft_cmd_data_AS(cmd, data, size):
+    display.command(cmd)
+    display.data(_buffer(data, size))
+    display.bus_time(120 * (size + 1))
+
+def tft_cmd(cmd):
+    display.command(cmd)
+    display.bus_time(300)
+
+def tft_write_data_AS(data, size):
+    display.data(_buffer(data, size))
+    display.bus_time(120 * size)
+
+def tft_read_cmd_data_AS(cmd, data, size):
+    display.command(cmd)
+    buf, offset = resolve(data)
+    if cmd == 0x2e or cmd == 0x3e:
+        view = memoryview(buf)[offset:offset + size]
+        display.read_pixels(view, size)
+    display.bus_time(130 * (size + 1))
+
+def swapbytes(data, size):
+    buf, offset = resolve(data)
+    for i in range(offset, offset + (size & ~1), 2):
+        buf[i], buf[i + 1] = buf[i + 1], buf[i]
+
+def swapcolors(data, size):
+    buf, offset = resolve(data)
+    for i in range(offset, offset + size - size % 3, 3):
+        buf[i], buf[i + 2] = buf[i + 2], buf[i]
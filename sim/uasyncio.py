@@ -0,0 +1,96 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Stand-in for uasyncio, based on the CPython asyncio module.
+#
+# The event loop runs on the virtual clock of sim.clock: when all tasks wait,
+# the clock is advanced to the next due task or the next event of a clock
+# listener (timer, touch trace) instead of blocking, so simulated time passes
+# only as fast as the host can process it.
+#
+import asyncio, selectors
+from asyncio import (Event, Lock, CancelledError, TimeoutError, create_task,
+                     gather, sleep, wait_for)
+from sim import clock
+
+class _Selector(selectors.DefaultSelector):
+
+    def select(self, timeout=None):
+        ready = super().select(0)
+        if ready or timeout == 0:
+            return ready
+        now = clock.ticks_us()
+        due = clock.next_event()  # stop there, it may wake up a task
+        if timeout is not None:
+            end = now + max(1, int(timeout * 1000000 + 0.999))
+            due = end if due is None else min(due, end)
+        elif due is None:
+            raise RuntimeError("all tasks wait for an event which never happens")
+        clock.advance_us(due - now)
+        return []
+
+class _Loop(asyncio.SelectorEventLoop):
+
+    def __init__(self):
+        super().__init__(_Selector())
+
+    def time(self):
+        return clock.ticks_us() / 1000000
+
+_loop = None
+
+def get_event_loop():
+    global _loop
+    if _loop is None or _loop.is_closed():
+        _loop = _Loop()
+        asyncio.set_event_loop(_loop)
+    return _loop
+
+new_event_loop = get_event_loop
+
+def run(coro):
+    return get_event_loop().run_until_complete(coro)
+
+async def sleep_ms(ms):
+    await asyncio.sleep(ms / 1000)
+
+async def wait_for_ms(aw, timeout):
+    return await asyncio.wait_for(aw, timeout / 1000)
+#
+# Event which may be set from an interrupt handler
+#
+class ThreadSafeFlag:
+
+    def __init__(self):
+        self._event = asyncio.Event()
+
+    def set(self):
+        self._event.set()
+
+    def clear(self):
+        self._event.clear()
+
+    async def wait(self):
+        await self._event.wait()
+        self._event.clear()
@@ -0,0 +1,57 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Stand-in for uctypes.addressof()
+#
+# There are no raw pointers under CPython. addressof() hands out a unique fake
+# address per object and records it, so that the simulated TFT_io functions
+# can map an address, optionally with an offset added, back to the buffer.
+#
+
+_BASE = 0x20000000
+
+_objects = []  # (address, object), in ascending address order
+_ids = {}
+_next = _BASE
+
+def addressof(obj):
+    global _next
+    addr = _ids.get(id(obj))
+    if addr is None:
+        addr = _next
+        _next += (len(obj) + 16) & ~7  # leave a gap between the objects
+        _ids[id(obj)] = addr
+        _objects.append((addr, obj))
+    return addr
+#
+# Return the tuple (object, offset) for an address returned by addressof(),
+# or (obj, 0) if obj is not an address but the buffer itself.
+#
+def resolve(obj):
+    if not isinstance(obj, int):
+        return obj, 0
+    for addr, buf in reversed(_objects):
+        if addr <= obj < addr + len(buf):
+            return buf, obj - addr
+    raise ValueError("invalid address 0x%x" % obj)
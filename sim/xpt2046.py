@@ -0,0 +1,506 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Simulated XPT2046 touch controller, to be passed as spi object to the drivers.
+#
+# It decodes the command bytes of the SPI frames like the chip does: a byte with
+# the start bit set starts a conversion, whose result is clocked out in the
+# following 16 bits, MSB first, 12 or 8 bits wide depending on the MODE bit.
+# The converted values follow a scripted stylus trace on the virtual clock of
+# sim.clock, with optional noise, single outliers (glitch) and contact bounce
+# at press and release.
+# ReplaySim returns the samples of a recorded touch session instead.
+#
+# Example:
+#
+#   trace = Trace().release(50).touch(200, 2000, 2000).release(50)
+#   spi = XPT2046Sim(trace, noise=8, bounce=5, irq=irq_pin)
+#   touch = XPT2046(spi=spi, irq=irq_pin)
+#
+from random import Random
+from sim import clock
+
+CH_Y  = 1
+CH_Z1 = 3
+CH_Z2 = 4
+CH_X  = 5
+#
+# A stylus trace: a sequence of segments, during which the stylus is either
+# lifted or pressed with the touch resistance rtouch, moving linearly from
+# x, y to x1, y1. Coordinates are raw 12 bit values, times are in ms.
+# The methods return the trace, such that calls can be chained.
+#
+class Trace:
+
+    def __init__(self):
+        self.segments = []  # (start_us, length_us, x, y, x1, y1, rtouch)
+        self.duration = 0   # in µs
+
+    def touch(self, ms, x, y, x1=None, y1=None, rtouch=300):
+        self._append(ms, x, y, x if x1 is None else x1, y if y1 is None else y1, rtouch)
+        return self
+
+    def release(self, ms):
+        self._append(ms, None, None, None, None, None)
+        return self
+
+    def tap(self, x, y, hold=150, pause=100, rtouch=300):
+        return self.touch(hold, x, y, rtouch=rtouch).release(pause)
+
+    def drag(self, x, y, x1, y1, ms=500, pause=100, rtouch=300):
+        return self.touch(ms, x, y, x1, y1, rtouch).release(pause)
+
+    def _append(self, ms, x, y, x1, y1, rtouch):
+        us = int(ms * 1000)
+        self.segments.append((self.duration, us, x, y, x1, y1, rtouch))
+        self.duration += us
+#
+# Return the segment index at time t (µs since start), or -1 at the end
+#
+    def find(self, t):
+        segments = self.segments
+        lo, hi = 0, len(segments)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if segments[mid][0] + segments[mid][1] <= t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < len(segments) else -1
+#
+# Return (x, y, rtouch) at time t, or None if the stylus is lifted
+#
+    def position(self, t):
+        i = self.find(t)
+        if i < 0 or self.segments[i][2] is None:
+            return None
+        start, length, x, y, x1, y1, rtouch = self.segments[i]
+        f = (t - start) / length if length else 0
+        return x + (x1 - x) * f, y + (y1 - y) * f, rtouch
+
+class XPT2046Sim:
+
+    def __init__(self, trace=None, *, noise=0, bounce=0, glitch=0, x_plate=400,
+                 irq=None, baudrate=1000000, timing=True, loop=False, seed=0):
+        self.noise = noise          # standard deviation of x and y in raw units
+        self.bounce = bounce * 1000 # bounce time in µs after press and before release
+        self.glitch = glitch        # probability of an outlier conversion of x or y
+        self.x_plate = x_plate      # x plate resistance used to create Z1 and Z2
+        self.irq = irq              # sim Pin, driven low while touched
+        self.baudrate = baudrate
+        self.timing = timing        # advance the clock by the transfer time
+        self.loop = loop            # restart the trace when finished
+        self.rand = Random(seed)
+        self.shift = 0              # output shift register
+        self.transfers = 0
+        self.conversions = 0
+        self.bytes = 0
+        self.bus_us = 0
+        self.trace = None
+        self.play(trace if trace is not None else Trace())
+#
+# Start a new trace at the current time
+#
+    def play(self, trace):
+        self.trace = trace
+        self.t0 = clock.ticks_us()
+        if self.irq is not None:
+            self.update(self.t0)
+            clock.add_listener(self)
+
+    def stop(self):
+        clock.remove_listener(self)
+#
+# Stylus state as tuple (x, y, rtouch) at the time now, or None if lifted,
+# including the bounce at press and release
+#
+    def state(self, now):
+        trace = self.trace
+        t = now - self.t0
+        if self.loop and trace.duration:
+            t %= trace.duration
+        i = trace.find(t)
+        if i < 0:
+            return None
+        pos = trace.position(t)
+        if pos is None or not self.bounce:
+            return pos
+        start, length = trace.segments[i][:2]
+        if t - start < self.bounce and self._lifted(i - 1):
+            level = (t - start) / self.bounce
+        elif start + length - t <= self.bounce and self._lifted(i + 1):
+            level = (start + length - t) / self.bounce
+        else:
+            return pos
+# Bouncing: contact comes and goes, with the light pressure pulling the
+# positions and rising the touch resistance
+        if self.rand.random() > 0.5 + level / 2:
+            return None
+        spread = 400 * (1 - level)
+        return (pos[0] + self.rand.uniform(-spread, spread),
+                pos[1] + self.rand.uniform(-spread, spread),
+                pos[2] * (1 + 20 * (1 - level)))
+
+    def _lifted(self, i):
+        segments = self.trace.segments
+        return i < 0 or i >= len(segments) or segments[i][2] is None
+#
+# Result of a conversion for channel ch
+#
+    def convert(self, ch, now):
+        self.conversions += 1
+        pos = self.state(now)
+        if pos is None:  # open: X and Z1 read low, Y and Z2 high
+            return 4095 if ch == CH_Y or ch == CH_Z2 else 0
+        x, y, rtouch = pos
+        noise = self.noise
+        if noise:
+            x += self.rand.gauss(0, noise)
+            y += self.rand.gauss(0, noise)
+        if self.glitch and self.rand.random() < self.glitch:
+            if ch == CH_X:
+                x += self.rand.choice((-1, 1)) * self.rand.uniform(200, 800)
+            elif ch == CH_Y:
+                y += self.rand.choice((-1, 1)) * self.rand.uniform(200, 800)
+        x = min(max(int(x + 0.5), 1), 4095)
+        y = min(max(int(y + 0.5), 0), 4095)
+        if ch == CH_X:
+            return x
+        if ch == CH_Y:
+            return y
+# Z2/Z1 = 1 + Rtouch * 4096 / (Rx * X), choose Z1 to keep Z2 in range
+        ratio = 1 + rtouch * 4096 / (self.x_plate * x)
+        z1 = 3800 / ratio
+        if noise:
+            z1 += self.rand.gauss(0, noise / 4)
+        z1 = min(max(int(z1), 1), 4095)
+        if ch == CH_Z1:
+            return z1
+        if ch == CH_Z2:
+            return min(int(z1 * ratio), 4095)
+        return 0  # temperature, battery and aux inputs are not simulated
+#
+# SPI interface
+#
+    def init(self, *args, **kwargs):
+        if "baudrate" in kwargs:
+            self.baudrate = kwargs["baudrate"]
+
+    def deinit(self):
+        pass
+
+    def write_readinto(self, write_buf, read_buf):
+        now = clock.ticks_us()
+        byte_us = 8000000 / self.baudrate
+        shift = self.shift
+        for i in range(len(write_buf)):
+            cmd = write_buf[i]
+            read_buf[i] = (shift >> 8) & 0xff
+            shift = (shift << 8) & 0xffff
+            if cmd & 0x80:  # start bit: convert, result follows MSB first
+                bits = 8 if cmd & 0x08 else 12
+                t = now + int((i + 1) * byte_us)
+                shift = self.convert((cmd >> 4) & 7, t) >> (12 - bits) << (15 - bits)
+        self.shift = shift
+        self._account(len(write_buf), byte_us)
+
+    def write(self, buf):
+        self.write_readinto(buf, bytearray(len(buf)))
+
+    def readinto(self, buf, write=0):
+        self.write_readinto(bytes([write]) * len(buf), buf)
+
+    def read(self, n, write=0):
+        buf = bytearray(n)
+        self.readinto(buf, write)
+        return buf
+
+    def _account(self, n, byte_us):
+        us = n * byte_us
+        self.transfers += 1
+        self.bytes += n
+        self.bus_us += us
+        if self.timing:
+            clock.advance_us(int(us + 0.5))
+#
+# Clock listener, driving the PENIRQ pin
+#
+    def next_event(self, now):
+        trace = self.trace
+        t = now - self.t0
+        if self.loop and trace.duration:
+            t = t % trace.duration
+        i = trace.find(t)
+        if i < 0:
+            return None
+        start, length = trace.segments[i][:2]
+        if self.bounce and trace.segments[i][2] is not None:
+            if t - start < self.bounce or start + length - t <= self.bounce:
+                return now + min(1000, start + length - t)  # bounce in 1 ms steps
+        return now + start + length - t
+
+    def update(self, now):
+        self.irq.drive(0 if self.state(now) is not None else 1)
+#
+# Replay of a touch trace recorded with start_recording() of the drivers.
+# The conversions return the values of the latest record at the time of the
+# conversion, with the start of the recording mapped to the start of the
+# replay. The records are stamped with the start of their transfer, so the
+# conversions of a transfer replayed at the recorded time return the values
+# of its record. Before the first and after the last record the touch pad is
+# open.
+# records is a file name, a binary stream or a list of tuples
+# (ticks, x, y, z1, z2) as returned by touch_trace.read_records(), with ticks
+# in µs. For a list, start is the ticks value of the recording start, default:
+# that of the first record.
+#
+class ReplaySim(XPT2046Sim):
+
+    def __init__(self, records, start=None, **kwargs):
+        self.start = start
+        super().__init__(records, **kwargs)
+
+    def play(self, records):
+        start = self.start
+        if isinstance(records, str):
+            with open(records, "rb") as f:
+                start, records = self.load(f)
+        elif hasattr(records, "read"):
+            start, records = self.load(records)
+        elif start is None:
+            start = records[0][0] if records else 0
+        self.records = records
+        self.times = []  # offsets of the records to the start in µs
+        t = 0
+        prev = start
+        for rec in records:
+            t += (rec[0] - prev) & 0x3fffffff  # ticks_us() wraps
+            prev = rec[0]
+            self.times.append(t)
+        # the last record lasts as long as the interval before it
+        self.tail = self.times[-1] - self.times[-2] if len(self.times) > 1 else 1000
+        self.t0 = clock.ticks_us()
+        if self.irq is not None:
+            self.update(self.t0)
+            clock.add_listener(self)
+
+    @staticmethod
+    def load(stream):
+        from touch_trace import read_header, read_records
+        start, size = read_header(stream)
+        return start, list(read_records(stream, size))
+
+    def find(self, now):
+        times = self.times
+        t = now - self.t0
+        if not times or t < times[0] or t > times[-1] + self.tail:
+            return -1
+        lo, hi = 0, len(times)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if times[mid] <= t:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo - 1
+
+    def state(self, now):
+        i = self.find(now)
+        if i < 0:
+            return None
+        ticks, x, y, z1, z2 = self.records[i]
+        if x <= 10 or y >= 4090:  # open, see X_LOW and Y_HIGH of the drivers
+            return None
+        return x, y, z1, z2
+
+    def convert(self, ch, now):
+        self.conversions += 1
+        pos = self.state(now)
+        if pos is None:
+            return 4095 if ch == CH_Y or ch == CH_Z2 else 0
+        if ch == CH_X:
+            return pos[0]
+        if ch == CH_Y:
+            return pos[1]
+        if ch == CH_Z1:
+            return pos[2]
+        if ch == CH_Z2:
+            return pos[3]
+        return 0
+
+    def next_event(self, now):
+        times = self.times
+        if not times:
+            return None
+        t = now - self.t0
+        i = self.find(now)
+        if t < times[0]:
+            return self.t0 + times[0]
+        if i >= 0 and i + 1 < len(times):
+            return self.t0 + times[i + 1]
+        if t < times[-1] + self.tail:
+            return self.t0 + times[-1] + self.tail
+        return None
+#
+# Several simulated touch controllers on one SPI bus, for TouchBus. A transfer
+# goes to the device whose chip select pin is low, with no device selected
+# the bus reads 0. More than one selected device is a fault of the driver.
+#
+#   bus = SPIBusSim()
+#   bus.attach(cs1, XPT2046Sim(trace1, irq=irq1))
+#   touch_bus = TouchBus(bus)
+#   touch_bus.add(cs1, irq=irq1)
+#
+class SPIBusSim:
+
+    def __init__(self, baudrate=1000000, timing=True):
+        self.baudrate = baudrate
+        self.timing = timing
+        self.devices = []  # (cs pin, device)
+        self.transfers = 0
+        self.bytes = 0
+        self.bus_us = 0
+
+    def attach(self, cs, device):
+        device.baudrate = self.baudrate
+        device.timing = False  # the bus advances the clock
+        self.devices.append((cs, device))
+        return device
+
+    def init(self, *args, **kwargs):
+        pass
+
+    def deinit(self):
+        pass
+
+    def selected(self):
+        found = [device for cs, device in self.devices if not cs()]
+        if len(found) > 1:
+            raise RuntimeError("more than one device selected")
+        return found[0] if found else None
+
+    def write_readinto(self, write_buf, read_buf):
+        device = self.selected()
+        if device is None:
+            for i in range(len(read_buf)):
+                read_buf[i] = 0
+        else:
+            device.write_readinto(write_buf, read_buf)
+        n = len(write_buf)
+        us = n * 8000000 / self.baudrate
+        self.transfers += 1
+        self.bytes += n
+        self.bus_us += us
+        if self.timing:
+            clock.advance_us(int(us + 0.5))
+
+    def write(self, buf):
+        self.write_readinto(buf, bytearray(len(buf)))
+
+    def readinto(self, buf, write=0):
+        self.write_readinto(bytes([write]) * len(buf), buf)
+
+    def read(self, n, write=0):
+        buf = bytearray(n)
+        self.readinto(buf, write)
+        return buf
+#
+# An XPT2046Sim connected to GPIO pins of a port, for drivers which bit-bang
+# the SPI frames through stm.mem16, like touch_bytecode.py. The model follows
+# the pin levels written to BSRRL/BSRRH and ODR: with each falling edge of the
+# clock the XPT2046 puts the next bit on DIN (its DOUT), with each rising edge
+# it takes a bit from DOUT (its DIN). Every complete byte is passed to the
+# byte level model. Each clock edge advances the virtual clock by edge_ns.
+#
+#   touch = TOUCH("XPT2046")  # of touch_bytecode
+#   spi = XPT2046Sim(trace, irq=touch.pin_irq)
+#   BitBangSim(spi)
+#
+class BitBangSim:
+
+    def __init__(self, device, port=None, clock_pin=1 << 5, dout=1 << 4, din=1 << 7, edge_ns=25000):
+        from sim import stm
+        self.device = device
+        device.timing = False  # the clock edges advance the clock
+        self.port = stm.GPIOC if port is None else port
+        self.clock_pin = clock_pin
+        self.dout = dout
+        self.din = din
+        self.edge_ns = edge_ns
+        self.odr = 0
+        self.bits = 0   # bits of the current byte
+        self.cmd = 0    # byte shifted in
+        self.out = 0    # byte shifted out
+        self.level = 0  # level of DIN
+        self.ns = 0     # time not yet passed to the clock
+        self.edges = 0
+        stm.attach(self.port, self)
+
+    def detach(self):
+        from sim import stm
+        stm.detach(self.port)
+
+    def read(self, offset):
+        from sim import stm
+        if offset == stm.GPIO_IDR:
+            return (self.odr & ~self.din) | (self.din if self.level else 0)
+        if offset == stm.GPIO_ODR:
+            return self.odr
+        return 0
+
+    def write(self, offset, value):
+        from sim import stm
+        old = odr = self.odr
+        if offset == stm.GPIO_BSRRL:
+            odr |= value
+        elif offset == stm.GPIO_BSRRH:
+            odr &= ~value
+        elif offset == stm.GPIO_ODR:
+            odr = value
+        else:
+            return
+        self.odr = odr
+        if (odr ^ old) & self.clock_pin:
+            self._edge(odr & self.clock_pin)
+
+    def _edge(self, high):
+        self._account()
+        if high:  # take a bit from DOUT of the driver
+            self.cmd = (self.cmd << 1) | (1 if self.odr & self.dout else 0)
+            self.bits += 1
+            if self.bits == 8:
+                device = self.device
+                device.write_readinto(bytes((self.cmd & 0xff,)), bytearray(1))
+                self.out = (device.shift >> 8) & 0xff  # the next byte to send
+                self.bits = 0
+                self.cmd = 0
+        else:  # the next bit to DIN of the driver
+            self.level = (self.out >> (7 - self.bits)) & 1
+
+    def _account(self):
+        self.edges += 1
+        self.ns += self.edge_ns
+        if self.ns >= 1000:
+            clock.advance_us(self.ns // 1000)
+            self.ns %= 1000
@@ -39,7 +39,9 @@
 
 import pyb, stm
 from uctypes import addressof
+from array import array
 import TFT_io
+from tft_batch import DrawBatch, MAX_SPANS
 
 # define constants
 #
@@ -56,6 +58,9 @@ POWER  = const(1 << 9) ## Y4
 PORTRAIT = const(1)
 LANDSCAPE = const(0)
 
+POINTS = const(256) # size of the point buffer of drawLine() and drawCircle()
+MIN_RUN = const(4)  # shorter runs of a line or circle are drawn as single pixels
+
 class TFT:
 
     def __init__(self, controller = "SSD1963", lcd_type = "LB04301", orientation = LANDSCAPE,  v_flip = False, h_flip = False):
@@ -93,9 +98,14 @@ class TFT:
         if orientation == PORTRAIT:
             self.setXY = TFT_io.setXY_P
             self.drawPixel = TFT_io.drawPixel_P
+            self.plotPixels = TFT_io.drawPixels_P
         else:
             self.setXY = TFT_io.setXY_L
             self.drawPixel = TFT_io.drawPixel_L
+            self.plotPixels = TFT_io.drawPixels_L
+        self.batch = None # immediate drawing, see begin_batch()
+        self.points = array("h", bytearray(4 * POINTS)) # x, y pairs
+        self.npoints = 0
         self.swapbytes = TFT_io.swapbytes
         self.swapcolors = TFT_io.swapcolors
 #  ----------
@@ -334,15 +344,45 @@ class TFT:
 # Rather slow at 40µs/Pixel
 #
     def drawPixel_py(self, x, y, color):
+        if self.batch is not None:
+            self.flush()
         self.setXY(x, y, x, y)
         TFT_io.displaySCR_AS(color, 1)  #
 #
+# Batch mode: after begin_batch(), lines, rectangles, circles and pixels are
+# recorded instead of being drawn, and overdrawn parts are dropped. flush()
+# draws what has been recorded in a single pass, end_batch() does that and
+# returns to immediate drawing. Text and bitmaps flush the batch first. Once
+# more than max_spans row spans are recorded, the batch is flushed as well,
+# which bounds the heap used by the batch.
+#
+    def begin_batch(self, max_spans=MAX_SPANS):
+        if self.batch is None:
+            self.batch = DrawBatch(self.setXY, max_spans)
+            self.drawPixel_immediate = self.drawPixel
+            self.drawPixel = self.batch.pixel
+
+    def flush(self):
+        if self.batch is not None:
+            self.batch.flush()
+
+    def end_batch(self):
+        if self.batch is not None:
+            self.batch.flush()
+            self.drawPixel = self.drawPixel_immediate
+            self.batch = None
+#
 # clear screen, set it to BG color.
 #
     def clrSCR(self, color = None):
         colorvect = self.BGcolorvect if color is None else bytearray(color)
-        self.clrXY()
-        TFT_io.fillSCR_AS(colorvect, (self.disp_x_size + 1) * (self.disp_y_size + 1))
+        if self.batch is not None: # everything recorded so far is covered
+            self.batch.clear()
+            width, height = self.getScreensize()
+            self.batch.fill(0, 0, width - 1, height - 1, colorvect)
+        else:
+            self.clrXY()
+            TFT_io.fillSCR_AS(colorvect, (self.disp_x_size + 1) * (self.disp_y_size + 1))
         self.setScrollArea(0, self.disp_y_size + 1, 0)
         self.setScrollStart(0)
         self.setTextPos(0,0)
@@ -357,6 +397,8 @@ class TFT:
 #
 # Draw a line from x1, y1 to x2, y2 with the color set by setColor()
 # Straight port from the UTFT Library at Rinky-Dink Electronics
+# The pixels of a slanted line are collected to runs of one row (or column),
+# the longer ones are drawn as line, the others with drawPixels().
 #
     def drawLine(self, x1, y1, x2, y2, color = None):
         if y1 == y2:
@@ -370,26 +412,63 @@ class TFT:
             col, row = x1, y1
             if dx < dy:
                 t = - (dy >> 1)
-                while True:
-                    self.drawPixel(col, row, colorvect)
-                    if row == y2:
-                        return
+                start = row  # first row of the actual run
+                while row != y2:
                     row += ystep
                     t += dx
                     if t >= 0:
+                        self._plotRun(col, min(start, row - ystep), col, max(start, row - ystep), colorvect)
+                        start = row
                         col += xstep
                         t -= dy
+                self._plotRun(col, min(start, row), col, max(start, row), colorvect)
             else:
                 t = - (dx >> 1)
-                while True:
-                    self.drawPixel(col, row, colorvect)
-                    if col == x2:
-                        return
+                start = col  # first column of the actual run
+                while col != x2:
                     col += xstep
                     t += dy
                     if t >= 0:
+                        self._plotRun(min(start, col - xstep), row, max(start, col - xstep), row, colorvect)
+                        start = col
                         row += ystep
                         t -= dx
+                self._plotRun(min(start, col), row, max(start, col), row, colorvect)
+            self._plotFlush(colorvect)
+#
+# Draw n pixels with coordinates points[2 * i], points[2 * i + 1], using a
+# single call of TFT_io. points is an array("h") or another buffer of 16 bit values
+#
+    def drawPixels(self, points, n, color = None):
+        colorvect = self.colorvect if color is None else bytearray(color)
+        if self.batch is not None:
+            for i in range(0, 2 * n, 2):
+                self.batch.pixel(points[i], points[i + 1], colorvect)
+        elif n > 0:
+            self.plotPixels(points, n, colorvect)
+#
+# Draw the horizontal or vertical run x1, y1 .. x2, y2 (x1 <= x2, y1 <= y2) of a
+# line or circle, the short ones by collecting the pixels in self.points
+#
+    def _plotRun(self, x1, y1, x2, y2, colorvect):
+        if x2 - x1 + y2 - y1 >= MIN_RUN - 1:
+            self.fillRectangle(x1, y1, x2, y2, colorvect)
+            return
+        points = self.points
+        n = self.npoints
+        for y in range(y1, y2 + 1):
+            for x in range(x1, x2 + 1):
+                points[n] = x
+                points[n + 1] = y
+                n += 2
+                if n >= 2 * POINTS:
+                    self.drawPixels(points, POINTS, colorvect)
+                    n = 0
+        self.npoints = n
+
+    def _plotFlush(self, colorvect):
+        self.drawPixels(self.points, self.npoints >> 1, colorvect)
+        self.npoints = 0
 #
 # Draw a horizontal line with 1 Pixel width, from x,y to x + l - 1, y
 # Straight port from the UTFT Library at Rinky-Dink Electronics
@@ -399,6 +478,9 @@ class TFT:
         if l < 0:  # negative length, swap parameters
             l = -l
             x -= l
+        if self.batch is not None:
+            self.batch.fill(x, y, x + l - 1, y, colorvect)
+            return
         self.setXY(x, y, x + l - 1, y) # set display window
         TFT_io.fillSCR_AS(colorvect, l)
 #
@@ -410,6 +492,9 @@ class TFT:
         if l < 0:  # negative length, swap parameters
             l = -l
             y -= l
+        if self.batch is not None:
+            self.batch.fill(x, y, x, y + l - 1, colorvect)
+            return
         self.setXY(x, y, x, y + l - 1) # set display window
         TFT_io.fillSCR_AS(colorvect, l)
 #
@@ -421,7 +506,7 @@ class TFT:
             x1, x2 = x2, x1
         if y1 > y2:
             y1, y2 = y2, y1
-    	self.drawHLine(x1, y1, x2 - x1 + 1, color)
+        self.drawHLine(x1, y1, x2 - x1 + 1, color)
         self.drawHLine(x1, y2, x2 - x1 + 1, color)
         self.drawVLine(x1, y1, y2 - y1 + 1, color)
         self.drawVLine(x2, y1, y2 - y1 + 1, color)
@@ -434,6 +519,9 @@ class TFT:
             x1, x2 = x2, x1
         if y1 > y2:
             y1, y2 = y2, y1
+        if self.batch is not None:
+            self.batch.fill(x1, y1, x2, y2, bytearray(color) if color else self.colorvect)
+            return
         self.setXY(x1, y1, x2, y2) # set display window
         if color:
             TFT_io.fillSCR_AS(bytearray(color), (x2 - x1 + 1) * (y2 - y1 + 1))
@@ -489,6 +577,8 @@ class TFT:
 #
 # draw a circle at x, y with radius
 # Straight port from the UTFT Library at Rinky-Dink Electronics
+# The points of one octant are collected to runs of one row, which are drawn
+# with their 8 mirror images by _circleRun().
 #
     def drawCircle(self, x, y, radius, color = None):
 
@@ -499,45 +589,59 @@ class TFT:
         ddF_y = -2 * radius
         x1 = 0
         y1 = radius
-
-        self.drawPixel(x, y + radius, colorvect)
-        self.drawPixel(x, y - radius, colorvect)
-        self.drawPixel(x + radius, y, colorvect)
-        self.drawPixel(x - radius, y, colorvect)
+        start = 0  # first x1 of the run at y1
 
         while x1 < y1:
             if f >= 0:
-	            y1 -= 1
-	            ddF_y += 2
-	            f += ddF_y
+                self._circleRun(x, y, start, x1, y1, colorvect)
+                start = x1 + 1
+                y1 -= 1
+                ddF_y += 2
+                f += ddF_y
             x1 += 1
             ddF_x += 2
             f += ddF_x
-            self.drawPixel(x + x1, y + y1, colorvect)
-            self.drawPixel(x - x1, y + y1, colorvect)
-            self.drawPixel(x + x1, y - y1, colorvect)
-            self.drawPixel(x - x1, y - y1, colorvect)
-            self.drawPixel(x + y1, y + x1, colorvect)
-            self.drawPixel(x - y1, y + x1, colorvect)
-            self.drawPixel(x + y1, y - x1, colorvect)
-            self.drawPixel(x - y1, y - x1, colorvect)
+        self._circleRun(x, y, start, x1, y1, colorvect)
+        self._plotFlush(colorvect)
+#
+# Draw the points a..b, h of an octant and their mirror images
+#
+    def _circleRun(self, x, y, a, b, h, colorvect):
+        if a == 0:  # the run crosses the axis
+            self._plotRun(x - b, y + h, x + b, y + h, colorvect)
+            self._plotRun(x - b, y - h, x + b, y - h, colorvect)
+            self._plotRun(x + h, y - b, x + h, y + b, colorvect)
+            self._plotRun(x - h, y - b, x - h, y + b, colorvect)
+        else:
+            self._plotRun(x + a, y + h, x + b, y + h, colorvect)
+            self._plotRun(x - b, y + h, x - a, y + h, colorvect)
+            self._plotRun(x + a, y - h, x + b, y - h, colorvect)
+            self._plotRun(x - b, y - h, x - a, y - h, colorvect)
+            self._plotRun(x + h, y + a, x + h, y + b, colorvect)
+            self._plotRun(x - h, y + a, x - h, y + b, colorvect)
+            self._plotRun(x + h, y - b, x + h, y - a, colorvect)
+            self._plotRun(x - h, y - b, x - h, y - a, colorvect)
 #
 # fill a circle at x, y with radius
-# Straight port from the UTFT Library at Rinky-Dink Electronics
-# Instead of calculating x = sqrt(r*r - y*y), it searches the x
-# for r*r = x*x + x*x
+# The shape is that of the UTFT Library at Rinky-Dink Electronics: row y +/- k
+# spans x - m .. x + m - 1, with m = ceil(sqrt(4 * r * r - (2 * k - 1)**2) / 2)
+# and m = r for k = 0. Like in the midpoint algorithm, s = int(sqrt(...)) follows
+# the edge from row to row by additions only, keeping the error term
+# e = 4 * r * r - (2 * k - 1)**2 - s * s >= 0. Each row is drawn once.
 #
     def fillCircle(self, x, y, radius, color = None):
-        r_square = radius * radius * 4
-        for y1 in range (-(radius * 2), 1):
-            y_square = y1 * y1
-            for x1 in range (-(radius * 2), 1):
-                if x1*x1+y_square <= r_square:
-                    x1i = x1 // 2
-                    y1i = y1 // 2
-                    self.drawHLine(x + x1i, y + y1i, 2 * (-x1i), color)
-                    self.drawHLine(x + x1i, y - y1i, 2 * (-x1i), color)
-                    break;
+        colorvect = self.colorvect if color is None else bytearray(color)
+        self.drawHLine(x - radius, y, 2 * radius, colorvect)
+        s = 2 * radius
+        e = -1
+        for k in range(1, radius + 1):
+            while e < 0:
+                s -= 1
+                e += 2 * s + 1
+            m = (s + 1) >> 1
+            self.drawHLine(x - m, y - k, 2 * m, colorvect)
+            self.drawHLine(x - m, y + k, 2 * m, colorvect)
+            e -= 8 * k
 #
 # Draw a bitmap at x,y with size sx, sy
 # mode determines the type of expected data
@@ -552,6 +656,8 @@ class TFT:
 # mode = 24: The data must contain 3 bytes/pixel red/green/blue
 #
     def drawBitmap(self, x, y, sx, sy, data, mode = 24, colortable = None):
+        if self.batch is not None:
+            self.flush()
         self.setXY(x, y, x + sx - 1, y + sy - 1)
         if mode == 24:
             TFT_io.displaySCR_AS(data, sx * sy)
@@ -685,6 +791,8 @@ class TFT:
 # clear line modes
 #
     def printClrLine(self, mode = 0): # clear to end of line/bol/line
+        if self.batch is not None:
+            self.flush()
         if mode == 0:
             self.setXY(self.text_x, self.text_y,
                        self.text_width - 1, self.text_y + self.text_rows - 1) # set display window
@@ -701,6 +809,8 @@ class TFT:
 # clear sreen modes
 #
     def printClrSCR(self): # clear Area set by setScrollArea
+        if self.batch is not None:
+            self.flush()
         self.setXY(0, self.scroll_tfa,
             self.text_width - 1, self.scroll_tfa + self.scroll_vsa) # set display window
         TFT_io.fillSCR_AS(self.text_color, self.text_width * self.scroll_vsa)
@@ -726,6 +836,8 @@ class TFT:
             fontptr, rows, cols = self.text_font.get_ch(ord(c))
         else:
             raise AttributeError('No font selected')
+        if self.batch is not None: # the text is drawn on top of the recorded operations
+            self.flush()
         pix_count = cols * rows   # number of bits in the char
 # test char fit
         if self.text_x + cols > self.text_width:  # does the char fit on the screen?
@@ -0,0 +1,179 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Batched drawing for the TFT class
+#
+# In batch mode the fill operations of TFT (lines, rectangles, circles, single
+# pixels) are not sent to the display at once, but recorded as spans per
+# display row. A new span clips the parts of the older spans it covers and
+# is merged with its neighbours of the same color, such that every row holds
+# a sorted list of disjoint spans, which is what the display shows after all
+# recorded operations. flush() sends them in a single pass, joining equal
+# spans of consecutive rows to rectangles, one setXY() and one fill each.
+# So pixels which are painted several times are sent only once.
+#
+# Each span takes about 40 bytes of heap. Once more than max_spans are
+# recorded, the batch is flushed, which limits the memory use to about
+# 40 * (max_spans + display rows) bytes.
+#
+import TFT_io
+
+MAX_SPANS = const(512)
+
+class DrawBatch:
+
+    def __init__(self, setXY, max_spans=MAX_SPANS):
+        self.setXY = setXY  # e.g. TFT.setXY
+        self.max_spans = max_spans
+        self.rows = {}      # y -> list of spans (x1, x2, color) in ascending x
+        self.spans = 0      # number of spans in rows
+        self.peak = 0       # largest number of spans before a flush
+        self.colors = []    # the colors in use, each one bytes object
+        self.ops = 0        # number of operations recorded
+        self.flushes = 0    # number of flush() calls, including those of the budget
+        self.rects = 0      # number of rectangles sent by flush()
+        self.pixels = 0     # number of pixels sent by flush()
+#
+# Drop all recorded operations
+#
+    def clear(self):
+        self.rows = {}
+        self.spans = 0
+        self.colors = []
+#
+# Return the bytes object of colors equal to color, adding it if needed.
+# Spans of one color then share a single object.
+#
+    def _color(self, color):
+        colors = self.colors
+        for i in range(len(colors)):
+            if colors[i] == color:
+                return colors[i]
+        color = bytes(color[:3])
+        colors.append(color)
+        return color
+#
+# Record a fill of the rectangle x1, y1, x2, y2 with color, given as
+# bytearray or bytes (r, g, b). Empty rectangles are ignored.
+#
+    def fill(self, x1, y1, x2, y2, color):
+        if x1 > x2 or y1 > y2:
+            return
+        self.ops += 1
+        span = (x1, x2, self._color(color))  # shared by all rows
+        rows = self.rows
+        n = self.spans
+        for y in range(y1, y2 + 1):
+            spans = rows.get(y)
+            if spans is None:
+                rows[y] = [span]
+                n += 1
+            elif x1 <= spans[0][0] and x2 >= spans[-1][1]:  # covers the row
+                n += 1 - len(spans)
+                spans.clear()
+                spans.append(span)
+            elif x1 > spans[-1][1]:  # right of the row
+                n -= len(spans)
+                _append(spans, span)
+                n += len(spans)
+            else:
+                n -= len(spans)
+                spans = _insert(spans, span)
+                rows[y] = spans
+                n += len(spans)
+        self.spans = n
+        if n > self.peak:
+            self.peak = n
+        if n > self.max_spans:
+            self.flush()
+#
+# Record a single pixel, with the arguments of TFT_io.drawPixel_L
+#
+    def pixel(self, x, y, colorvect):
+        self.fill(x, y, x, y, colorvect)
+#
+# Send the recorded spans to the display and clear them. Spans with the same
+# ends and color in consecutive rows are sent as one rectangle.
+#
+    def flush(self):
+        setXY = self.setXY
+        rows = self.rows
+        start = {}  # (x1, x2, color) -> first row of an open rectangle
+        last = {}   # (x1, x2, color) -> last row of an open rectangle
+        for y in sorted(rows):
+            for key in rows[y]:
+                if key in last and last[key] != y - 1:  # rows between are empty
+                    self._send(setXY, key, start.pop(key), last.pop(key))
+                if key not in start:
+                    start[key] = y
+                last[key] = y
+            for key in [key for key in last if last[key] != y]:  # ended
+                self._send(setXY, key, start.pop(key), last.pop(key))
+        for key in last:
+            self._send(setXY, key, start[key], last[key])
+        self.clear()
+        self.flushes += 1
+
+    def _send(self, setXY, key, y1, y2):
+        x1, x2, color = key
+        n = (x2 - x1 + 1) * (y2 - y1 + 1)
+        setXY(x1, y1, x2, y2)
+        TFT_io.fillSCR_AS(color, n)
+        self.rects += 1
+        self.pixels += n
+#
+# Insert the span new = (x1, x2, color) into the sorted list of disjoint spans and return the
+# new list. Older spans are clipped, adjacent spans of one color are joined.
+#
+def _insert(spans, new):
+    x1, x2, _ = new
+    result = []
+    for span in spans:
+        a, b, c = span
+        if b < x1:
+            _append(result, span)
+        elif a > x2:
+            if new is not None:
+                _append(result, new)
+                new = None
+            _append(result, span)
+        else:  # overlap: keep the uncovered ends
+            if a < x1:
+                _append(result, (a, x1 - 1, c))
+            if new is not None:
+                _append(result, new)
+                new = None
+            if b > x2:
+                _append(result, (x2 + 1, b, c))
+    if new is not None:
+        _append(result, new)
+    return result
+
+def _append(result, span):
+    if result:
+        a, b, c = result[-1]
+        if b + 1 == span[0] and c == span[2]:
+            result[-1] = (a, span[1], c)
+            return
+    result.append(span)
@@ -24,193 +24,125 @@
 #
 # Class supporting the resisitve touchpad of TFT LC-displays
 #
-import pyb, stm
 from machine import SPI, Pin
-# define constants
-#
-T_GETX  = const(0xd0)  ## 12 bit resolution
-T_GETY  = const(0x90)  ## 12 bit resolution
-T_GETZ1 = const(0xb8)  ## 8 bit resolution
-T_GETZ2 = const(0xc8)  ## 8 bit resolution
-#
-X_LOW  = const(10)     ## lowest reasonable X value from the touchpad
-Y_HIGH = const(4090)   ## highest reasonable Y value
+from touch_core import TouchCore, SPITransport
+from touch_filter import MEAN
+from touch_queue import DOWN, MOVE, UP
 
-class TOUCH:
+class TOUCH(TouchCore):
 #
 # Init just sets the PIN's to In / out as required
 # async: set True if asynchronous operation intended
 # confidence: confidence level - number of consecutive touches with a margin smaller than the given level
 #       which the function will sample until it accepts it as a valid touch
 # margin: Distance from mean centre at which touches are considered at the same position
-# delay: Delay between samples in ms. (n/a if asynchronous)
-#
-    DEFAULT_CAL = (-3917, -0.127, -3923, -0.1267, -3799, -0.07572, -3738,  -0.07814)
-
-    def __init__(self, controller="XPT2046", asyn=False, *, confidence=5, margin=50, delay=10, calibration=None, spi = None):
+# delay: Delay between samples in ms, also used as sample period in asynchronous mode
+# spi: SPI object. If None, a SPI object with the pins X12, X11 and Y2 is created
+# oversample: Number of conversions per channel done back to back by read_batch(), which are averaged
+# threshold: Highest touch resistance in Ohm accepted as valid touch. 0 = no pressure test
+# x_plate: Resistance of the X plate of the touch pad in Ohm, used for the pressure calculation
+# irq: Pin object connected to PENIRQ of the XPT2046. If set, the touch pad is only sampled
+#       after PENIRQ signalled a touch, and sampling stops again after the release.
+# queue_size: Number of events the event queue holds, see events()
+# The synchronous methods are those of TouchCore in touch_core.py.
+#
+    def __init__(self, controller="XPT2046", asyn=False, *, confidence=5, margin=50, delay=10, calibration=None, spi = None, oversample=1, threshold=0, x_plate=400, irq=None, queue_size=16, adaptive=False, filter_mode=MEAN, motion=False):
         if spi is None:
             self.spi = SPI(-1, baudrate=1000000, sck=Pin("X12"), mosi=Pin("X11"), miso=Pin("Y2"))
         else:
             self.spi = spi
-        self.recv = bytearray(3)
-        self.xmit = bytearray(3)
-# set default values
-        self.ready = False
-        self.touched = False
-        self.x = 0
-        self.y = 0
-        self.buf_length = 0
-        cal = TOUCH.DEFAULT_CAL if calibration is None else calibration
-        self.asynchronous = False
-        self.touch_parameter(confidence, margin, delay, cal)
+        super().__init__(SPITransport(self.spi), confidence=confidence, margin=margin, delay=delay,
+                         calibration=calibration, oversample=oversample, threshold=threshold,
+                         x_plate=x_plate, irq=irq, queue_size=queue_size, adaptive=adaptive,
+                         filter_mode=filter_mode, motion=motion)
         if asyn:
             self.asynchronous = True
             import uasyncio as asyncio
+            self.touch_event = asyncio.Event()  # set on a validated touch
+            self.queue_event = asyncio.Event()  # set when events are queued
+            if irq is not None:
+                self.irq_flag = asyncio.ThreadSafeFlag()  # set by the PENIRQ handler
             loop = asyncio.get_event_loop()
             loop.create_task(self._main_thread())
 
-# set parameters for get_touch()
-# res: Resolution in bits of the returned values, default = 10
-# confidence: confidence level - number of consecutive touches with a margin smaller than the given level
-#       which the function will sample until it accepts it as a valid touch
-# margin: Difference from mean centre at which touches are considered at the same position
-# delay: Delay between samples in ms.
-#
-    def touch_parameter(self, confidence=5, margin=50, delay=10, calibration=None):
-        if not self.asynchronous: # Ignore attempts to change on the fly.
-            confidence = max(min(confidence, 25), 5)
-            if confidence != self.buf_length:
-                self.buff = [[0,0] for x in range(confidence)]
-                self.buf_length = confidence
-            self.delay = max(min(delay, 100), 5)
-            margin = max(min(margin, 100), 1)
-            self.margin = margin * margin # store the square value
-            if calibration:
-                self.calibration = calibration
-
-# get_touch(): Synchronous use. get a touch value; Parameters:
-#
-# initital: Wait for a non-touch state before getting a sample.
-#           True = Initial wait for a non-touch state
-#           False = Do not wait for a release
-# wait: Wait for a touch or not?
-#       False: Do not wait for a touch and return immediately
-#       True: Wait until a touch is pressed.
-# raw: Setting whether raw touch coordinates (True) or normalized ones (False) are returned
-#      setting the calibration vector to (0, 1, 0, 1, 0, 1, 0, 1) result in a identity mapping
-# timeout: Longest time (ms, or None = 1 hr) to wait for a touch or release
-#
-# Return (x,y) or None
-#
-    def get_touch(self, initial=True, wait=True, raw=False, timeout=None):
-        if self.asynchronous:
-            return None # Should only be called in synhronous mode
-        if timeout is None:
-            timeout = 3600000 # set timeout to 1 hour
-#
-        if initial:  ## wait for a non-touch state
-            sample = True
-            while sample and timeout > 0:
-                sample = self.raw_touch()
-                pyb.delay(self.delay)
-                timeout -= self.delay
-            if timeout <= 0: # after timeout, return None
-                return None
-#
-        buff = self.buff
-        buf_length = self.buf_length
-        buffptr = 0
-        nsamples = 0
-        while timeout > 0:
-            if nsamples == buf_length:
-                meanx = sum([c[0] for c in buff]) // buf_length
-                meany = sum([c[1] for c in buff]) // buf_length
-                dev = sum([(c[0] - meanx)**2 + (c[1] - meany)**2 for c in buff]) / buf_length
-                if dev <= self.margin: # got one; compare against the square value
-                    if raw:
-                        return (meanx, meany)
-                    else:
-                        return self.do_normalize((meanx, meany))
-# get a new value
-            sample = self.raw_touch()  # get a touch
-            if sample is None:
-                if not wait:
-                    return None
-                nsamples = 0    # Invalidate buff
-            else:
-                buff[buffptr] = sample # put in buff
-                buffptr = (buffptr + 1) % buf_length
-                nsamples = min(nsamples + 1, buf_length)
-            pyb.delay(self.delay)
-            timeout -= self.delay
-        return None
-
 # Asynchronous use: this thread maintains self.x and self.y
+# It samples the touch pad every delay ms. With an irq pin, it sleeps while
+# the touch pad is not pressed, until the PENIRQ handler wakes it up.
+#
     async def _main_thread(self):
         import uasyncio as asyncio
-        buff = self.buff
-        buf_length = self.buf_length
-        buffptr = 0
-        nsamples = 0
+        filt = self.filter
+        sample = self.sample
+        filt.reset()
         await asyncio.sleep(0)
         while True:
-            if nsamples == buf_length:
-                meanx = sum([c[0] for c in buff]) // buf_length
-                meany = sum([c[1] for c in buff]) // buf_length
-                dev = sum([(c[0] - meanx)**2 + (c[1] - meany)**2 for c in buff]) / buf_length
-                if dev <= self.margin: # got one; compare against the square value
+            if self.irq_flag is not None and not self.pen_down():
+                await self.irq_flag.wait()  # idle until PENIRQ
+            if self.pen_down() and self.raw_touch_into(sample):  # get a touch
+                self.touched = True
+                filt.add(sample[0], sample[1]) # put in buff
+                if filt.stable(self.margin): # got one; compare against the square value
+                    self.x, self.y = self.do_normalize((filt.meanx, filt.meany))
                     self.ready = True
-                    self.x, self.y = self.do_normalize((meanx, meany))
-            sample = self.raw_touch()  # get a touch
-            if sample is None:
+                    self.touch_event.set()
+            else:
                 self.touched = False
                 self.ready = False
-                nsamples = 0    # Invalidate buff
-            else:
-                self.touched = True
-                buff[buffptr] = sample # put in buff
-                buffptr = (buffptr + 1) % buf_length
-                nsamples = min(nsamples + 1, buf_length)
-            await asyncio.sleep(0)
+                filt.reset()    # Invalidate buff
+            self._track(self.touched, self.ticks_ms())
+            if self.motion is not None and self.ev_down: # continuous tracking
+                self.x, self.y = self.ev_x, self.ev_y
+                self.ready = True
+                self.touch_event.set()
+            if self.event_queue.count():
+                self.queue_event.set()
+            await asyncio.sleep_ms(self.delay)
+
+# touch(): Asynchronous use. Wait for a validated touch and return (x, y).
+# Waiting tasks do not consume CPU time until the sampling thread has a
+# stable touch. While the touch pad is held, each call returns the next
+# stabilised position.
+#
+    async def touch(self):
+        if not self.asynchronous:
+            return None # Should only be called in asynchronous mode
+        if not self.ready:
+            self.touch_event.clear()
+            await self.touch_event.wait()
+        self.ready = False
+        return self.x, self.y
+
+# aevents()
+# Asynchronous iterator over the touch events, for use in uasyncio tasks:
+#     async for kind, x, y, ticks in mytouch.aevents():
+# In asynchronous mode the events are created by the sampling thread, otherwise
+# the touch pad is polled every delay ms.
+#
+    def aevents(self):
+        return _AsyncEvents(self)
 
-# Asynchronous get_touch
-    def get_touch_async(self):
-        if self.ready:
-            self.ready = False
-            return self.x, self.y
-        return None
-#
-# do_normalize(touch)
-# calculate the screen coordinates from the touch values, using the calibration values
-# touch must be the tuple return by get_touch
-#
-    def do_normalize(self, touch):
-        xmul = self.calibration[3] + (self.calibration[1] - self.calibration[3]) * (touch[1] / 4096)
-        xadd = self.calibration[2] + (self.calibration[0] - self.calibration[2]) * (touch[1] / 4096)
-        ymul = self.calibration[7] + (self.calibration[5] - self.calibration[7]) * (touch[0] / 4096)
-        yadd = self.calibration[6] + (self.calibration[4] - self.calibration[6]) * (touch[0] / 4096)
-        x = int((touch[0] + xadd) * xmul)
-        y = int((touch[1] + yadd) * ymul)
-        return (x, y)
-#
-# raw_touch(tuple)
-# raw read touch. Returns (x,y) or None
-#
-    def raw_touch(self):
-        global CONTROL_PORT
-        x  = self.touch_talk(T_GETX, 12)
-        y  = self.touch_talk(T_GETY, 12)
-        if x > X_LOW and y < Y_HIGH:  # touch pressed?
-            return (x, y)
-        else:
-            return None
 #
-# Send a command to the touch controller and wait for the response
-# cmd:  command byte
-# bits: expected data size. Reasonable values are 8 and 12
+# Asynchronous iterator returned by TOUCH.aevents()
 #
-    def touch_talk(self, cmd, bits):
-        self.xmit[0] = cmd
-        self.spi.write_readinto(self.xmit, self.recv)
-        return (self.recv[1] * 256 + self.recv[2]) >> (15 - bits)
+class _AsyncEvents:
+
+    def __init__(self, touch):
+        self.touch = touch
 
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        import uasyncio as asyncio
+        touch = self.touch
+        while True:
+            if not touch.asynchronous:
+                touch.poll_events()
+            event = touch.event_queue.get()
+            if event is not None:
+                return event
+            if touch.asynchronous:  # wait for the sampling thread
+                touch.queue_event.clear()
+                await touch.queue_event.wait()
+            else:
+                await asyncio.sleep_ms(touch.delay)
@@ -0,0 +1,155 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+#
+# Several XPT2046 touch pads on one SPI bus. TouchBus owns the SPI object and
+# drives the pads, each with its own chip select, in a single loop: every
+# cycle takes one sample of each pad in turn, either by poll() or by the
+# callback of a single timer (start_sampler()). So the bus is never used by
+# two pads at a time, and the bus load is the sum of the pads' transactions,
+# see bytes_per_cycle(). Pads with an irq pin cause no traffic while they are
+# not touched.
+#
+# The pads are XPT2046 objects of xpt2046_syn, each with its own filter,
+# calibration and event queue. Pads with the same oversample setting share the
+# command and receive buffers of read_batch(), since only one transaction runs
+# at a time.
+#
+from time import sleep_ms
+from machine import Pin, Timer
+from xpt2046_syn import XPT2046
+
+class TouchBus:
+
+    def __init__(self, spi, *, delay=10):
+        self.spi = spi
+        self.delay = max(min(delay, 100), 5)
+        self.devices = []
+        self.buffers = {}  # oversample: (batch_xmit, batch_recv)
+        self.timer = None
+        self.size = 0  # ring size of the running sampler
+#
+# add(cs, **kwargs)
+# Attach a touch pad with the chip select pin cs. The keyword arguments are
+# those of XPT2046, e.g. calibration, confidence or irq. Returns the XPT2046
+# object, which is also devices[n] with n being the index reported by events().
+# touch_parameter() of the device may be used later on; after changing
+# oversample, call share_buffers() to share the new buffers again. While the
+# sampler runs, the new pad gets its ring before the timer callback sees it.
+#
+    def add(self, cs, **kwargs):
+        cs.init(Pin.OUT, value=1)
+        device = XPT2046(self.spi, cs, **kwargs)
+        if self.timer is not None:
+            device._setup_sampler(self.size)
+            device.bus_sampled = True
+        self.devices.append(device)
+        self.share_buffers()
+        return device
+#
+# Let devices with the same oversample setting use the same buffers
+#
+    def share_buffers(self):
+        buffers = self.buffers
+        for device in self.devices:
+            shared = buffers.get(device.oversample)
+            if shared is None:
+                buffers[device.oversample] = (device.batch_xmit, device.batch_recv)
+            else:
+                device.batch_xmit, device.batch_recv = shared
+#
+# Number of bytes sent over the bus in one cycle with all pads touched. At a
+# sample rate of freq Hz, the bus is busy for
+#   bytes_per_cycle() * 8 * freq / baudrate
+# of the time, e.g. 2 pads with oversample 1: 18 * 8 * 100 / 1000000 = 1.4%
+#
+    def bytes_per_cycle(self):
+        return sum(len(device.batch_xmit) for device in self.devices)
+#
+# poll()
+# Take one sample of each pad (or all samples of the background sampler, if it
+# is running) and update their event queues. Returns the total number of
+# waiting events.
+#
+    def poll(self):
+        n = 0
+        for device in self.devices:
+            n += device.poll_events()
+        return n
+#
+# events(timeout=None)
+# Generator yielding the events of all pads as tuples (n, kind, x, y, ticks),
+# with n being the index of the pad in devices. The pads are polled every
+# delay ms. With a timeout (in ms) the generator ends when no event arrived
+# for that time. The events of a single pad may as well be taken from its
+# event_queue after poll().
+#
+    def events(self, timeout=None):
+        devices = self.devices
+        idle = 0
+        while True:
+            if self.poll():
+                idle = 0
+                for n in range(len(devices)):
+                    queue = devices[n].event_queue
+                    event = queue.get()
+                    while event is not None:
+                        yield (n,) + event
+                        event = queue.get()
+            elif timeout is not None and idle >= timeout:
+                return
+            sleep_ms(self.delay)
+            idle += self.delay
+#
+# start_sampler(timer, freq=100, size=32)
+# Sample all pads in the background at freq Hz from the callback of timer,
+# a machine.Timer object. Each pad gets a ring of size samples, which is
+# drained by poll(), events() or read_sample() of the pad. The timer belongs
+# to the bus: the pads only get the flag bus_sampled, so stop_sampler() of a
+# single pad does not stop it. Only stop_sampler() of the bus does.
+#
+    def start_sampler(self, timer, freq=100, size=32):
+        self.stop_sampler()
+        for device in self.devices:
+            device._setup_sampler(size)
+            device.bus_sampled = True
+        self.size = size
+        self.timer = timer
+        timer.init(mode=Timer.PERIODIC, freq=freq, callback=self._sample_isr)
+
+    def stop_sampler(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+            for device in self.devices:
+                device.bus_sampled = False
+                device.stop_sampler()
+#
+# Timer callback: one sample of each pad. Like XPT2046._sample_isr() it does
+# not allocate memory, so the list is indexed instead of iterated.
+#
+    def _sample_isr(self, timer):
+        devices = self.devices
+        for i in range(len(devices)):
+            devices[i]._sample_isr(timer)
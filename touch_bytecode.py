@@ -26,6 +26,8 @@
 # It uses Y5..Y8 of PyBoard
 #
 import pyb, stm
+from touch_core import TouchCore
+from touch_filter import MEAN
 # define constants
 #
 PCB_VERSION = 2
@@ -46,15 +48,159 @@ if PCB_VERSION == 2:
 
 # T_CS is not used and must be hard tied to GND
 
-T_GETX  = const(0xd0)  ## 12 bit resolution
-T_GETY  = const(0x90)  ## 12 bit resolution
-T_GETZ1 = const(0xb8)  ## 8 bit resolution
-T_GETZ2 = const(0xc8)  ## 8 bit resolution
 #
-X_LOW  = const(10)     ## lowest reasonable X value from the touchpad
-Y_HIGH = const(4090)   ## highest reasonable Y value 
+# Transport for TouchCore, which bit-bangs the SPI frames on the GPIO port
+#
+class BitBangTransport:
+
+    def __init__(self, port=CONTROL_PORT):
+        self.port = port
+#
+# Send the bytes of xmit and store the bytes received meanwhile in recv,
+# MSB first, like a SPI in mode 0
+#
+# Straight down coding of the data sheet's timing diagram
+# This is the slow bytecode implementations
+# Clock low & high cycles must last at least 200ns
+# At the moment it is set to about 25us each.
+# The XPT2046 changes DOUT after the high->low transient of the clock,
+# so data is sampled after the low->high transient
+#
+    def transfer(self, xmit, recv):
+        gpio_bsr = self.port + stm.GPIO_BSRRL
+        gpio_idr = self.port + stm.GPIO_IDR
+        for i in range(len(xmit)):
+            out = xmit[i]
+            result = 0
+            for _ in range(8):
+                stm.mem16[gpio_bsr + 2] = T_CLOCK # set clock low in the beginning
+                if out & 0x80:
+                    stm.mem16[gpio_bsr + 0] = T_DOUT # set data bit high
+                else:
+                    stm.mem16[gpio_bsr + 2] = T_DOUT # set data bit low
+                stm.mem16[gpio_bsr + 0] = T_CLOCK # set clock high
+                if stm.mem16[gpio_idr + 0] & T_DIN: # get data
+                    result = (result << 1) | 1
+                else:
+                    result <<= 1
+                out <<= 1
+            recv[i] = result
+        stm.mem16[gpio_bsr + 2] = T_CLOCK | T_DOUT # Clock & data low
+
+try:
+#
+# Viper version of BitBangTransport.transfer()
+# xmit and recv are bytearrays of size bytes. Each half clock cycle is extended
+# by a loop of delay passes, to keep it longer than the 200ns of the data sheet.
+# At 168 MHz, a 12 bit conversion of read_batch() should take about 15 µs with delay = 4.
+#
+    @micropython.viper
+    def bitbang_viper(xmit: ptr8, recv: ptr8, size: int, delay: int):
+        port = int(CONTROL_PORT)
+        gpio = ptr16(port + stm.GPIO_BSRRL)
+        gpio_idr = ptr16(port + stm.GPIO_IDR)
+        for i in range(size):
+            out = xmit[i]
+            result = 0
+            for _ in range(8):
+                gpio[1] = T_CLOCK  # set clock low
+                if out & 0x80:
+                    gpio[0] = T_DOUT  # set data bit high
+                else:
+                    gpio[1] = T_DOUT  # set data bit low
+                d = delay
+                while d > 0:
+                    d -= 1
+                gpio[0] = T_CLOCK  # set clock high
+                if gpio_idr[0] & T_DIN:  # get data
+                    result = (result << 1) | 1
+                else:
+                    result <<= 1
+                out <<= 1
+                d = delay
+                while d > 0:
+                    d -= 1
+            recv[i] = result
+        gpio[1] = T_CLOCK | T_DOUT  # Clock & data low
+#
+# Assembler version of BitBangTransport.transfer() for PCB_VERSION 2 (GPIOC)
+# The delay loops take 3 cycles per pass. At 168 MHz, with delay = 12 the
+# clock runs at about 2 MHz, and a 12 bit conversion of read_batch() takes
+# about 9 µs. Use bitbangtest.py for measuring it.
+#
+    @micropython.asm_thumb
+    def bitbang_asm(r0, r1, r2, r3):  # r0: ptr to xmit, r1: ptr to recv, r2: size, r3: delay
+# r4: byte to send, r5: byte received, r6: scratch
+# r7: GPIOC register ptr
+        movwt(r7, stm.GPIOC)
+        b(byteend)
+
+        label(bytestart)
+        ldrb(r4, [r0, 0])  # byte to send
+        lsl(r4, r4, 24)  # bit 7 to the top
+        mov(r5, 1)  # the 1 is shifted out after 8 bits
+
+        label(bitstart)
+        mov(r6, T_CLOCK)
+        strh(r6, [r7, stm.GPIO_BSRRH])  # clock low
+        mov(r6, T_DOUT)
+        lsl(r4, r4, 1)  # next data bit into carry
+        bcs(bitone)
+        strh(r6, [r7, stm.GPIO_BSRRH])  # data low
+        b(bitset)
+        label(bitone)
+        strh(r6, [r7, stm.GPIO_BSRRL])  # data high
+        label(bitset)
+        mov(r6, r3)
+        label(waitlow)
+        sub(r6, 1)
+        bgt(waitlow)
+        mov(r6, T_CLOCK)
+        strh(r6, [r7, stm.GPIO_BSRRL])  # clock high
+        ldrh(r6, [r7, stm.GPIO_IDR])  # get data
+        lsr(r6, r6, 8)  # T_DIN (bit 7) into carry
+        adc(r5, r5)  # shift it in
+        mov(r6, r3)
+        label(waithigh)
+        sub(r6, 1)
+        bgt(waithigh)
+        cmp(r5, 255)  # all 8 bits in?
+        bls(bitstart)
+
+        strb(r5, [r1, 0])  # store the byte, without the marker bit
+        add(r0, 1)  # advance data ptrs
+        add(r1, 1)
 
-class TOUCH:
+        label(byteend)
+        sub(r2, 1)  # End of loop?
+        bpl(bytestart)
+        mov(r6, T_CLOCK | T_DOUT)
+        strh(r6, [r7, stm.GPIO_BSRRH])  # Clock & data low
+
+    HAS_NATIVE = True
+except NameError:  # no native code support, e.g. when running on the host
+    HAS_NATIVE = False
+
+#
+# Transports with the viper and assembler versions
+#
+class ViperTransport:
+
+    def __init__(self, delay=4):
+        self.delay = delay
+
+    def transfer(self, xmit, recv):
+        bitbang_viper(xmit, recv, len(xmit), self.delay)
+
+class AsmTransport:
+
+    def __init__(self, delay=12):
+        self.delay = delay
+
+    def transfer(self, xmit, recv):
+        bitbang_asm(xmit, recv, len(xmit), self.delay)
+
+class TOUCH(TouchCore):
 #
 # Init just sets the PIN's to In / out as required
 # objsched: scheduler if asynchronous operation intended
@@ -62,9 +208,14 @@ class TOUCH:
 #       which the function will sample until it accepts it as a valid touch
 # margin: Difference from mean centre at which touches are considered at the same position 
 # delay: Delay between samples in ms. (n/a if asynchronous)
+# transport: BitBangTransport(), ViperTransport() or AsmTransport(). Default: AsmTransport(),
+#       or BitBangTransport() if native code is not supported
+# irq: Pin object connected to PENIRQ. Default: pin_irq, the PENIRQ pin of the PCB.
+# The other parameters and the methods are those of TouchCore in touch_core.py.
 #
-    DEFAULT_CAL = (-3917, -0.127, -3923, -0.1267, -3799, -0.07572, -3738,  -0.07814)
-    def __init__(self, controller = "XPT2046", objsched = None, *, confidence = 5, margin = 50, delay = 10, calibration = None):
+    def __init__(self, controller = "XPT2046", objsched = None, *, confidence = 5, margin = 50, delay = 10, calibration = None,
+                 oversample=1, threshold=0, x_plate=400, irq=None, queue_size=16, adaptive=False, filter_mode=MEAN,
+                 motion=False, transport=None):
         if PCB_VERSION == 1:
             self.pin_clock = pyb.Pin("Y8", pyb.Pin.OUT_PP)
             self.pin_clock.value(0)
@@ -77,206 +228,37 @@ class TOUCH:
             self.pin_d_out = pyb.Pin("X12", pyb.Pin.OUT_PP)
             self.pin_d_in  = pyb.Pin("Y1", pyb.Pin.IN)
             self.pin_irq   = pyb.Pin("Y2", pyb.Pin.IN)
-# set default values
-        self.ready = False
-        self.touched = False
-        self.x = 0
-        self.y = 0
-        self.buf_length = 0
-        cal = TOUCH.DEFAULT_CAL if calibration is None else calibration
-        self.asynchronous = False
-        self.touch_parameter(confidence, margin, delay, cal)
+        if irq is None:
+            irq = self.pin_irq
+        if transport is None:
+            transport = AsmTransport() if HAS_NATIVE else BitBangTransport()
+        super().__init__(transport, confidence=confidence, margin=margin, delay=delay,
+                         calibration=calibration, oversample=oversample, threshold=threshold,
+                         x_plate=x_plate, irq=irq, queue_size=queue_size, adaptive=adaptive,
+                         filter_mode=filter_mode, motion=motion)
         if objsched is not None:
             self.asynchronous = True
             objsched.add_thread(self._main_thread())
 
-# set parameters for get_touch()
-# res: Resolution in bits of the returned values, default = 10
-# confidence: confidence level - number of consecutive touches with a margin smaller than the given level
-#       which the function will sample until it accepts it as a valid touch
-# margin: Difference from mean centre at which touches are considered at the same position 
-# delay: Delay between samples in ms.
-#
-    def touch_parameter(self, confidence = 5, margin = 50, delay = 10, calibration = None):
-        if not self.asynchronous: # Ignore attempts to change on the fly.
-            confidence = max(min(confidence, 25), 5)
-            if confidence != self.buf_length:
-                self.buff = [[0,0] for x in range(confidence)]
-                self.buf_length = confidence
-            self.delay = max(min(delay, 100), 5)
-            margin = max(min(margin, 100), 1)
-            self.margin = margin * margin # store the square value
-            if calibration:
-                self.calibration = calibration
-
-# get_touch(): Synchronous use. get a touch value; Parameters:
-#
-# initital: Wait for a non-touch state before getting a sample. 
-#           True = Initial wait for a non-touch state
-#           False = Do not wait for a release
-# wait: Wait for a touch or not?
-#       False: Do not wait for a touch and return immediately
-#       True: Wait until a touch is pressed. 
-# raw: Setting whether raw touch coordinates (True) or normalized ones (False) are returned
-#      setting the calibration vector to (0, 1, 0, 1, 0, 1, 0, 1) result in a identity mapping
-# timeout: Longest time (ms, or None = 1 hr) to wait for a touch or release
-#
-# Return (x,y) or None
-#
-    def get_touch(self, initial = True, wait = True, raw = False, timeout = None):
-        if self.asynchronous:
-            return None # Should only be called in synhronous mode
-        if timeout == None: 
-            timeout = 3600000 # set timeout to 1 hour
-# 
-        if initial:  ## wait for a non-touch state
-            sample = True
-            while sample and timeout > 0:
-                sample = self.raw_touch()
-                pyb.delay(self.delay)
-                timeout -= self.delay
-            if timeout <= 0: # after timeout, return None
-                return None
-#
-        buff = self.buff
-        buf_length = self.buf_length
-        buffptr = 0
-        nsamples = 0
-        while timeout > 0:
-            if nsamples == buf_length:
-                meanx = sum([c[0] for c in buff]) // buf_length
-                meany = sum([c[1] for c in buff]) // buf_length
-                dev = sum([(c[0] - meanx)**2 + (c[1] - meany)**2 for c in buff]) / buf_length
-                if dev <= self.margin: # got one; compare against the square value
-                    if raw:
-                        return (meanx, meany)
-                    else: 
-                        return self.do_normalize((meanx, meany))
-# get a new value 
-            sample = self.raw_touch()  # get a touch
-            if sample == None:
-                if not wait:
-                    return None
-                nsamples = 0    # Invalidate buff
-            else:
-                buff[buffptr] = sample # put in buff
-                buffptr = (buffptr + 1) % buf_length
-                nsamples = min(nsamples +1, buf_length)
-            pyb.delay(self.delay)
-            timeout -= self.delay
-        return None
-
 # Asynchronous use: this thread maintains self.x and self.y
     def _main_thread(self):
-        buff = self.buff
-        buf_length = self.buf_length
-        buffptr = 0
-        nsamples = 0
+        filt = self.filter
+        sample = self.sample
+        filt.reset()
         yield # Initialisation complete, wait for scheduler to start
         while True:
-            if nsamples == buf_length:
-                meanx = sum([c[0] for c in buff]) // buf_length
-                meany = sum([c[1] for c in buff]) // buf_length
-                dev = sum([(c[0] - meanx)**2 + (c[1] - meany)**2 for c in buff]) / buf_length
-                if dev <= self.margin: # got one; compare against the square value
+            if self.pen_down() and self.raw_touch_into(sample):  # get a touch
+                self.touched = True
+                filt.add(sample[0], sample[1]) # put in buff
+                if filt.stable(self.margin): # got one; compare against the square value
                     self.ready = True
-                    self.x, self.y = self.do_normalize((meanx, meany))
-            sample = self.raw_touch()  # get a touch
-            if sample == None:
+                    self.x, self.y = self.do_normalize((filt.meanx, filt.meany))
+            else:
                 self.touched = False
                 self.ready = False
-                nsamples = 0    # Invalidate buff
-            else:
-                self.touched = True
-                buff[buffptr] = sample # put in buff
-                buffptr = (buffptr + 1) % buf_length
-                nsamples = min(nsamples + 1, buf_length)
+                filt.reset()    # Invalidate buff
+            self._track(self.touched, self.ticks_ms())
+            if self.motion is not None and self.ev_down: # continuous tracking
+                self.x, self.y = self.ev_x, self.ev_y
+                self.ready = True
             yield
-
-# Asynchronous get_touch
-    def get_touch_async(self):
-        if self.ready:
-            self.ready = False
-            return self.x, self.y
-        return None
-# 
-# do_normalize(touch)
-# calculate the screen coordinates from the touch values, using the calibration values
-# touch must be the tuple return by get_touch
-#
-    def do_normalize(self, touch):
-        xmul = self.calibration[3] + (self.calibration[1] - self.calibration[3]) * (touch[1] / 4096)
-        xadd = self.calibration[2] + (self.calibration[0] - self.calibration[2]) * (touch[1] / 4096)
-        ymul = self.calibration[7] + (self.calibration[5] - self.calibration[7]) * (touch[0] / 4096)
-        yadd = self.calibration[6] + (self.calibration[4] - self.calibration[6]) * (touch[0] / 4096)
-        x = int((touch[0] + xadd) * xmul)
-        y = int((touch[1] + yadd) * ymul)
-        return (x, y)
-#
-# raw_touch(tuple)
-# raw read touch. Returns (x,y) or None
-#
-    def raw_touch(self):
-        x  = self.touch_talk(T_GETX, 12)
-        y  = self.touch_talk(T_GETY, 12)
-        if x > X_LOW and y < Y_HIGH:  # touch pressed?
-            return (x, y)
-        else:
-            return None
-#
-# Send a command to the touch controller and wait for the response
-# cmd is the command byte
-# int is the expected size of return data bits
-# port is the gpio base port
-#
-# Straight down coding of the data sheet's timing diagram
-# This is the slow bytecode implementations
-# Clock low & high cycles must last at least 200ns
-# At the moment it is set to about 25us each, 
-# 1050µs total at 168 MHz clock rate.
-# Total net time for a 12 bit sample: ~ 1050 µs
-#
-    def touch_talk(self, cmd, bits):
-
-        global CONTROL_PORT
-        gpio_bsr = CONTROL_PORT + stm.GPIO_BSRRL
-        gpio_idr = CONTROL_PORT + stm.GPIO_IDR
-#
-# now shift the command out, which is 8 bits 
-# data is sampled at the low-> high transient
-#
-        stm.mem16[gpio_bsr + 2] = T_CLOCK # Empty clock cycle before start, maybe obsolete
-        mask = 0x80  # high bit first
-        for i in range(8):
-            stm.mem16[gpio_bsr + 2] = T_CLOCK # set clock low in the beginning
-            if cmd & mask:
-                stm.mem16[gpio_bsr + 0] = T_DOUT # set data bit high
-            else:
-                stm.mem16[gpio_bsr + 2] = T_DOUT # set data bit low
-            for i in range(1): pass #delay
-            stm.mem16[gpio_bsr + 0] = T_CLOCK # set clock high
-            mask >>= 1
-        stm.mem16[gpio_bsr + 2] = T_CLOCK | T_DOUT# Another clock & data, low
-        stm.mem16[gpio_bsr + 0] = T_CLOCK # clock High
-#
-# now shift the data in, which is 8 or 12 bits 
-# data is sampled after the high->low transient
-#
-        result = 0
-        for i in range(bits):
-            stm.mem16[gpio_bsr + 2] = T_CLOCK # Clock low
-            if stm.mem16[gpio_idr + 0] & T_DIN: # get data
-                bit = 1
-            else:
-                bit = 0
-            result = (result << 1) | bit # shift data in
-            stm.mem16[gpio_bsr + 0] = T_CLOCK # Clock high
-#
-# another clock cycle, maybe obsolete
-#
-        stm.mem16[gpio_bsr + 2] = T_CLOCK # Another clock toggle, low
-        stm.mem16[gpio_bsr + 0] = T_CLOCK # clock High
-        stm.mem16[gpio_bsr + 2] = T_CLOCK # Clock low
-# now we're ready to leave
-        return result
-
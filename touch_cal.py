@@ -0,0 +1,237 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Calibration of the touch pad
+#
+# Three models map the 12 bit touch pad values (tx, ty) to screen coordinates:
+#
+# - bilinear: the classic calibration vector of 8 numbers (xadd_top, xmul_top,
+#   xadd_bot, xmul_bot, yadd_left, ymul_left, yadd_right, ymul_right). The
+#   offset and scale for x are interpolated between top and bottom along y,
+#   and those for y between left and right along x.
+# - affine: x = a*tx + b*ty + c, y = d*tx + e*ty + f
+# - perspective: x = (a*tx + b*ty + c) / w, y = (d*tx + e*ty + f) / w,
+#   with w = g*tx + h*ty + 1
+#
+# Affine and perspective transforms are determined by solve() from N measured
+# point pairs with a least squares fit and are returned as Transform object.
+# Since rotation and mirroring are part of the matrix, they work for any
+# orientation of the screen, including PORTRAIT.
+#
+# compile_cal() converts a calibration once into integer coefficients, such
+# that normalize_into() needs only integer operations and does not allocate
+# memory. Scale factors are stored with 16 fractional bits, the perspective
+# terms g and h with 24. For the bilinear model the result matches the float
+# calculation within +/- 1 pixel.
+#
+from array import array
+
+FRAC_BITS = const(16)
+BILINEAR = const(0)
+AFFINE = const(1)
+PERSPECTIVE = const(2)
+
+#
+# Transform: result of solve(). coeff holds (a, b, c, d, e, f) for an affine
+# and (a, b, c, d, e, f, g, h) for a perspective transform. residuals is the
+# distance in pixels between the mapped and the target point for each point
+# pair, and rms their root mean square. repr() gives a string, which can be
+# pasted into the source code to set the calibration.
+#
+class Transform:
+
+    def __init__(self, coeff, perspective=False):
+        self.coeff = tuple(coeff)
+        self.perspective = perspective
+        self.residuals = ()
+        self.rms = 0.0
+
+    def __repr__(self):
+        return "Transform(({}), {})".format(
+            ", ".join("{:.8g}".format(c) for c in self.coeff), self.perspective)
+#
+# Map a touch pad point to screen coordinates (float)
+#
+    def apply(self, tx, ty):
+        c = self.coeff
+        x = c[0] * tx + c[1] * ty + c[2]
+        y = c[3] * tx + c[4] * ty + c[5]
+        if self.perspective:
+            w = c[6] * tx + c[7] * ty + 1.0
+            return x / w, y / w
+        return x, y
+#
+# Solve the linear equation system m * x = v by Gaussian elimination with
+# partial pivoting. m is a list of rows, which is modified.
+#
+def _solve_linear(m, v):
+    n = len(v)
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(m[r][col]))
+        if abs(m[pivot][col]) < 1e-12:
+            raise ValueError("Calibration points are degenerated")
+        m[col], m[pivot] = m[pivot], m[col]
+        v[col], v[pivot] = v[pivot], v[col]
+        for r in range(col + 1, n):
+            f = m[r][col] / m[col][col]
+            if f:
+                for k in range(col, n):
+                    m[r][k] -= f * m[col][k]
+                v[r] -= f * v[col]
+    x = [0.0] * n
+    for r in range(n - 1, -1, -1):
+        s = v[r] - sum(m[r][k] * x[k] for k in range(r + 1, n))
+        x[r] = s / m[r][r]
+    return x
+#
+# Least squares solution of the overdetermined system: each row of rows
+# is the coefficient vector of one equation with the right side in rhs.
+# Solved via the normal equations.
+#
+def _least_squares(rows, rhs):
+    n = len(rows[0])
+    m = [[sum(row[i] * row[j] for row in rows) for j in range(n)] for i in range(n)]
+    v = [sum(row[i] * b for row, b in zip(rows, rhs)) for i in range(n)]
+    return _solve_linear(m, v)
+#
+# solve(raw, screen, perspective=False)
+# Determine the transform from the touch pad points raw[i] = (tx, ty) to the
+# screen points screen[i] = (x, y). An affine transform needs at least 3
+# points, a perspective transform at least 4. More points reduce the effect
+# of measurement noise. Raises ValueError, if the points do not determine
+# the transform, e.g. if they are on a line.
+#
+def solve(raw, screen, perspective=False):
+    npoints = len(raw)
+    if npoints != len(screen):
+        raise ValueError("Number of raw and screen points differs")
+    if npoints < (4 if perspective else 3):
+        raise ValueError("Not enough calibration points")
+    S = 1 / 4096  # scale the touch pad values to 0..1 for a better conditioned system
+    if perspective:
+        rows = []
+        rhs = []
+        for (tx, ty), (x, y) in zip(raw, screen):
+            u, v = tx * S, ty * S
+            rows.append((u, v, 1, 0, 0, 0, -u * x, -v * x))
+            rhs.append(x)
+            rows.append((0, 0, 0, u, v, 1, -u * y, -v * y))
+            rhs.append(y)
+        c = _least_squares(rows, rhs)
+    else:
+        rows = [(tx * S, ty * S, 1) for tx, ty in raw]
+        c = (_least_squares(rows, [p[0] for p in screen]) +
+             _least_squares(rows, [p[1] for p in screen]))
+    for i in (0, 1, 3, 4, 6, 7):  # undo the scaling
+        if i < len(c):
+            c[i] *= S
+    t = Transform(c, perspective)
+    res = []
+    for (tx, ty), (x, y) in zip(raw, screen):
+        mx, my = t.apply(tx, ty)
+        res.append(((mx - x) ** 2 + (my - y) ** 2) ** 0.5)
+    t.residuals = tuple(res)
+    t.rms = (sum(r * r for r in res) / npoints) ** 0.5
+    return t
+#
+# compile_cal(cal)
+# Convert a calibration, either the bilinear vector of 8 numbers or a
+# Transform, into an array('i') of integer coefficients for normalize_into().
+# The first element tells the model.
+#
+def compile_cal(cal):
+    if isinstance(cal, Transform):
+        c = cal.coeff
+        coeff = [round(v * 65536) for v in c[:6]]
+        if cal.perspective:
+            return array('i', [PERSPECTIVE] + coeff + [round(c[6] * 16777216), round(c[7] * 16777216)])
+        return array('i', [AFFINE] + coeff + [0, 0])
+    return array('i', (BILINEAR,
+        round(cal[3] * 65536), round((cal[1] - cal[3]) * 65536),  # x scale
+        round(cal[2]), round(cal[0] - cal[2]),                    # x offset
+        round(cal[7] * 65536), round((cal[5] - cal[7]) * 65536),  # y scale
+        round(cal[6]), round(cal[4] - cal[6])))                   # y offset
+#
+# normalize_into(tx, ty, cal, out)
+# Map the 12 bit touch pad values tx, ty to screen coordinates using the
+# compiled calibration cal and store them in out[0], out[1]. out must be
+# an array('h') or similar of at least 2 elements.
+# This is the pure Python version, which is also used on the host.
+#
+def normalize_py(tx, ty, cal, out):
+    mode = cal[0]
+    if mode == BILINEAR:
+        xmul = cal[1] + ((cal[2] * ty + 2048) >> 12)
+        xadd = cal[3] + ((cal[4] * ty + 2048) >> 12)
+        ymul = cal[5] + ((cal[6] * tx + 2048) >> 12)
+        yadd = cal[7] + ((cal[8] * tx + 2048) >> 12)
+        x = (tx + xadd) * xmul
+        y = (ty + yadd) * ymul
+        out[0] = x >> FRAC_BITS if x >= 0 else -((-x) >> FRAC_BITS)  # truncate like int()
+        out[1] = y >> FRAC_BITS if y >= 0 else -((-y) >> FRAC_BITS)
+    else:
+        x = cal[1] * tx + cal[2] * ty + cal[3]
+        y = cal[4] * tx + cal[5] * ty + cal[6]
+        if mode == AFFINE:
+            out[0] = (x + 32768) >> FRAC_BITS
+            out[1] = (y + 32768) >> FRAC_BITS
+        else:
+            w = ((cal[7] * tx + cal[8] * ty) >> 8) + 65536
+            out[0] = (x + (w >> 1)) // w
+            out[1] = (y + (w >> 1)) // w
+
+try:
+    @micropython.viper
+    def normalize_viper(tx: int, ty: int, cal: ptr32, out: ptr16):
+        mode = cal[0]
+        if mode == BILINEAR:
+            xmul = cal[1] + ((cal[2] * ty + 2048) >> 12)
+            xadd = cal[3] + ((cal[4] * ty + 2048) >> 12)
+            ymul = cal[5] + ((cal[6] * tx + 2048) >> 12)
+            yadd = cal[7] + ((cal[8] * tx + 2048) >> 12)
+            x = (tx + xadd) * xmul
+            y = (ty + yadd) * ymul
+            if x < 0:
+                x = 0 - ((0 - x) >> 16)
+            else:
+                x = x >> 16
+            if y < 0:
+                y = 0 - ((0 - y) >> 16)
+            else:
+                y = y >> 16
+        else:
+            x = cal[1] * tx + cal[2] * ty + cal[3]
+            y = cal[4] * tx + cal[5] * ty + cal[6]
+            if mode == AFFINE:
+                x = (x + 32768) >> 16
+                y = (y + 32768) >> 16
+            else:
+                w = ((cal[7] * tx + cal[8] * ty) >> 8) + 65536
+                x = (x + (w >> 1)) // w
+                y = (y + (w >> 1)) // w
+        out[0] = x
+        out[1] = y
+
+    normalize_into = normalize_viper
+except NameError:  # no viper support, e.g. when running on the host
+    normalize_into = normalize_py
@@ -0,0 +1,554 @@
+# The MIT License (MIT)
+#
+# Copyright (c) 2016, 2017 Robert Hammelrath (basic driver)
+#               2016 Peter Hinch (asyncio extension)
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Core of the XPT2046 touch pad drivers: sample filtering, pressure test,
+# calibration, event queue, background sampler and recording. The drivers
+# touch.py, xpt2046_syn.py and touch_bytecode.py are subclasses of TouchCore,
+# which differ in the transport of the SPI frames and the asynchronous mode.
+#
+# A transport has a single method transfer(xmit, recv), which sends the bytes
+# of xmit with chip select asserted and stores the bytes received meanwhile in
+# recv. The clock is an object with the functions sleep_ms(), ticks_ms() and
+# ticks_us(), by default the time module.
+#
+import time
+from machine import Pin, Timer
+from array import array
+from touch_filter import RingFilter, RankFilter, AlphaBeta, MEAN
+from touch_cal import compile_cal, normalize_into
+from touch_queue import SampleRing, EventQueue, PEN_UP, DOWN, MOVE, UP
+# define constants
+#
+T_GETX  = const(0xd0)  ## 12 bit resolution
+T_GETY  = const(0x90)  ## 12 bit resolution
+T_GETZ1 = const(0xb8)  ## 8 bit resolution
+T_GETZ2 = const(0xc8)  ## 8 bit resolution
+T_GETZ1_12 = const(0xb0)  ## 12 bit resolution, used by read_batch()
+T_GETZ2_12 = const(0xc0)  ## 12 bit resolution, used by read_batch()
+#
+X_LOW  = const(10)     ## lowest reasonable X value from the touchpad
+Y_HIGH = const(4090)   ## highest reasonable Y value
+R_MAX  = const(0xffff)  ## touch resistance reported if there is no touch
+
+#
+# Transport by a SPI object of the machine or pyb module, with an optional
+# chip select pin. Without cs, CS of the XPT2046 must be tied to GND.
+#
+class SPITransport:
+
+    def __init__(self, spi, cs=None):
+        self.spi = spi
+        self.cs = cs
+
+    def transfer(self, xmit, recv):
+        if self.cs is not None:
+            self.cs(0)
+        self.spi.write_readinto(xmit, recv)
+        if self.cs is not None:
+            self.cs(1)
+
+class TouchCore:
+#
+# transport: the transport object, see above
+# clock: object with sleep_ms(), ticks_ms() and ticks_us(), default: the time module
+# confidence: confidence level - number of consecutive touches with a margin smaller than the given level
+#       which the function will sample until it accepts it as a valid touch
+# margin: Distance from mean centre at which touches are considered at the same position
+# delay: Delay between samples in ms
+# oversample: Number of conversions per channel done back to back by read_batch(), which are averaged
+# threshold: Highest touch resistance in Ohm accepted as valid touch. 0 = no pressure test
+# x_plate: Resistance of the X plate of the touch pad in Ohm, used for the pressure calculation
+# irq: Pin object connected to PENIRQ of the XPT2046. If set, the touch pad is only sampled
+#       after PENIRQ signalled a touch, and sampling stops again after the release.
+# queue_size: Number of events the event queue holds, see events()
+# adaptive, filter_mode, motion: see touch_parameter()
+#
+    DEFAULT_CAL = (-3917, -0.127, -3923, -0.1267, -3799, -0.07572, -3738,  -0.07814)
+
+    def __init__(self, transport, *, clock=None, confidence=5, margin=50, delay=10, calibration=None, oversample=1,
+                 threshold=0, x_plate=400, irq=None, queue_size=16, adaptive=False, filter_mode=MEAN, motion=False):
+        self.transport = transport
+        if clock is None:
+            clock = time
+        self.sleep_ms = clock.sleep_ms
+        self.ticks_ms = clock.ticks_ms
+        self.ticks_us = clock.ticks_us
+        self.recv = bytearray(3)
+        self.xmit = bytearray(3)
+        self.sample = array('H', (0, 0))  # slot for a single x, y sample
+        self.xyz = array('H', (0, 0, 0, 0))  # result of read_batch()
+        self.oversample = 0
+        self.x_plate = x_plate
+        self.pressure = R_MAX
+        self.event_queue = EventQueue(queue_size)
+        self.ev_sample = array('H', (0, 0, 0, 0))
+        self.norm_out = array('h', (0, 0))  # result of normalize_into()
+        self.ev_down = False
+        self.ev_samples = 0  # samples of a touch before DOWN
+        self.ev_x = 0
+        self.ev_y = 0
+        self.pen_irq = False
+        self.irq = irq
+        self.irq_flag = None  # set by the asynchronous drivers
+        self.timer = None
+        self.bus_sampled = False  # sampled by the timer of a TouchBus
+        self.ring = None
+        self.recorder = None
+        if irq is not None:
+            irq.init(Pin.IN, Pin.PULL_UP)
+            irq.irq(trigger=Pin.IRQ_FALLING, handler=self._irq_handler)
+# set default values
+        self.ready = False
+        self.touched = False
+        self.x = 0
+        self.y = 0
+        self.buf_length = 0
+        self.filter_mode = MEAN
+        cal = self.DEFAULT_CAL if calibration is None else calibration
+        self.asynchronous = False
+        self.touch_parameter(confidence, margin, delay, cal, oversample, threshold, adaptive, filter_mode,
+                             motion)
+
+# set parameters for get_touch()
+# res: Resolution in bits of the returned values, default = 10
+# confidence: confidence level - number of consecutive touches with a margin smaller than the given level
+#       which the function will sample until it accepts it as a valid touch
+# margin: Difference from mean centre at which touches are considered at the same position
+# delay: Delay between samples in ms. In asynchronous mode, this is the only parameter
+#       which can be changed on the fly.
+# oversample: Number of conversions per channel in a single read_batch() transaction.
+#       From 3 on, the lowest and highest value of each channel are dropped
+# threshold: Highest touch resistance in Ohm accepted as valid touch. 0 = no pressure test
+#       Since invalid samples are rejected by the pressure test, confidence may then be as low as 2,
+#       like with oversample >= 3
+# adaptive: Accept a touch before confidence samples are taken, if the deviation of the
+#       samples taken so far is small enough, see RingFilter.stable(). confidence is then
+#       the largest number of samples.
+# filter_mode: Position and stability test of the samples: MEAN (plain mean),
+#       MEDIAN or TRIMMED (trimmed mean) of touch_filter. MEDIAN and TRIMMED ignore
+#       the lowest and highest quarter of the samples, so single outliers do not matter.
+# motion: Follow a moving touch with an AlphaBeta motion filter on the single samples
+#       instead of the mean of the samples. This reduces the lag of the MOVE events while
+#       dragging. self.motion may be replaced by an AlphaBeta object with other gains.
+#
+    def touch_parameter(self, confidence=5, margin=50, delay=10, calibration=None, oversample=1, threshold=0,
+                        adaptive=False, filter_mode=MEAN, motion=False):
+        self.delay = max(min(delay, 100), 5)
+        if self.asynchronous: # Ignore attempts to change on the fly.
+            return
+        self.threshold = max(threshold, 0)
+        confidence = max(min(confidence, 25), 2 if self.threshold or oversample >= 3 else 5)
+        if confidence != self.buf_length or filter_mode != self.filter_mode:
+            if filter_mode == MEAN:
+                self.filter = RingFilter(confidence)
+            else:
+                self.filter = RankFilter(confidence, filter_mode)
+            self.buf_length = confidence
+            self.filter_mode = filter_mode
+        self.filter.adaptive = adaptive
+        self.motion = AlphaBeta() if motion else None
+        margin = max(min(margin, 100), 1)
+        self.margin = margin * margin # store the square value
+        if calibration:
+            self.calibration = calibration
+            self.cal_fp = compile_cal(calibration)  # fixed point version for do_normalize()
+        oversample = max(min(oversample, 16), 1)
+        if oversample != self.oversample:
+            self._setup_batch(oversample)
+
+# get_touch(): Synchronous use. get a touch value; Parameters:
+#
+# initital: Wait for a non-touch state before getting a sample.
+#           True = Initial wait for a non-touch state
+#           False = Do not wait for a release
+# wait: Wait for a touch or not?
+#       False: Do not wait for a touch and return immediately
+#       True: Wait until a touch is pressed.
+# raw: Setting whether raw touch coordinates (True) or normalized ones (False) are returned
+#      setting the calibration vector to (0, 1, 0, 1, 0, 1, 0, 1) result in a identity mapping
+# timeout: Longest time (ms, or None = 1 hr) to wait for a touch or release
+#
+# Return (x,y) or None
+#
+    def get_touch(self, initial=True, wait=True, raw=False, timeout=None):
+        if self.asynchronous:
+            return None # Should only be called in synchronous mode
+        if timeout is None:
+            timeout = 3600000 # set timeout to 1 hour
+#
+        if initial:  ## wait for a non-touch state
+            sample = True
+            while sample and timeout > 0:
+                sample = self.pen_down() and self.raw_touch_into(self.sample)
+                self.sleep_ms(self.delay)
+                timeout -= self.delay
+            if timeout <= 0: # after timeout, return None
+                return None
+#
+        filt = self.filter
+        sample = self.sample
+        filt.reset()
+        while timeout > 0:
+            if filt.stable(self.margin): # got one; compare against the square value
+                if raw:
+                    return (filt.meanx, filt.meany)
+                else:
+                    return self.do_normalize((filt.meanx, filt.meany))
+# get a new value
+            if self.pen_down() and self.raw_touch_into(sample):  # get a touch
+                filt.add(sample[0], sample[1]) # put in buff
+            else:
+                if not wait:
+                    return None
+                filt.reset()    # Invalidate buff
+            self.sleep_ms(self.delay)
+            timeout -= self.delay
+        return None
+#
+# start_sampler(timer, freq=100, size=32)
+# Sample the touch pad in the background at freq Hz, driven by the callback of
+# timer, a machine.Timer object. The raw samples are stored in a ring of size
+# records, which the application drains with read_sample() at its own pace.
+# While the sampler runs, get_touch() and raw_touch() must not be used.
+# After stop_sampler(), poll_events() and events() sample the touch pad directly
+# again, once they have taken the samples left in the ring.
+#
+    def start_sampler(self, timer, freq=100, size=32):
+        self.stop_sampler()
+        self._setup_sampler(size)
+        self.timer = timer
+        timer.init(mode=Timer.PERIODIC, freq=freq, callback=self._sample_isr)
+#
+# Create the ring of the sampler. Used by start_sampler() and by TouchBus,
+# which calls _sample_isr() of all its devices from a single timer.
+#
+    def _setup_sampler(self, size):
+        self.ring = SampleRing(size)
+        self.isr_sample = array('H', (0, 0))
+        self.isr_down = False
+        if self.recorder is not None:
+            self.recorder.defer = True
+
+    def stop_sampler(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+        if self.recorder is not None:
+            self.recorder.defer = False
+            self.recorder.write_pending()
+#
+# Timer callback of the sampler. It does not allocate memory, so it may run
+# as hard interrupt. A release is recorded once with x == y == PEN_UP.
+#
+    def _sample_isr(self, timer):
+        sample = self.isr_sample
+        if self.pen_down() and self.raw_touch_into(sample):
+            self.ring.put(sample[0], sample[1], self.pressure, self.ticks_ms())
+            self.isr_down = True
+        elif self.isr_down:
+            self.ring.put(PEN_UP, PEN_UP, R_MAX, self.ticks_ms())
+            self.isr_down = False
+#
+# read_sample(buf, index=0)
+# Non-blocking: copy the oldest sample of the background sampler into
+# buf[index:index + 4] as x, y, pressure, ticks_ms() & 0xffff and return True,
+# or return False if no sample is waiting.
+#
+    def read_sample(self, buf, index=0):
+        return self.ring is not None and self.ring.get_into(buf, index)
+#
+# Number of samples waiting in the ring of the background sampler
+#
+    def samples_waiting(self):
+        return 0 if self.ring is None else self.ring.count()
+#
+# get_touch_async()
+# Asynchronous use: return the last validated touch (x, y) of the sampling
+# thread once, or None
+#
+    def get_touch_async(self):
+        if self.ready:
+            self.ready = False
+            return self.x, self.y
+        return None
+#
+# Event interface
+# A touch is reported as a sequence of (kind, x, y, ticks) events with kind being
+# DOWN, MOVE or UP of touch_queue and ticks the value of ticks_ms(). DOWN is created
+# once the samples are stable according to confidence and margin. A touch which
+# moves from the start, like a flick, is never stable: it gets its DOWN at the
+# mean of the buffer after 2 * confidence samples, once the first samples with
+# a possible bounce of the press have left the buffer. After that,
+# every change of the position (mean of the buffer, or the estimate of the motion
+# filter) creates a MOVE, and the release an UP with the last position. Events are
+# collected in a bounded queue, which merges MOVE events if the consumer lags behind.
+#
+# _track(touched, ticks)
+# Update the event state after a sample has been added to the filter (touched = True)
+# or the touch pad was found released (touched = False)
+#
+    def _track(self, touched, ticks):
+        filt = self.filter
+        motion = self.motion
+        if touched:
+            if not self.ev_down:
+                self.ev_samples += 1
+                if not filt.stable(self.margin):
+                    if self.ev_samples < 2 * self.buf_length:
+                        return
+                    filt.update_mean()  # moving touch
+                if motion is not None:
+                    motion.start(filt.meanx, filt.meany, ticks)
+            elif motion is not None:
+                motion.update(filt.lastx, filt.lasty, ticks)
+            else:
+                filt.update_mean()
+            out = self.norm_out
+            if motion is None:
+                normalize_into(filt.meanx, filt.meany, self.cal_fp, out)
+            else:
+                normalize_into(motion.x, motion.y, self.cal_fp, out)
+            x = out[0]
+            y = out[1]
+            if not self.ev_down:
+                self.ev_down = True
+                self.event_queue.put(DOWN, x, y, ticks)
+            elif x != self.ev_x or y != self.ev_y:
+                self.event_queue.put(MOVE, x, y, ticks)
+            self.ev_x = x
+            self.ev_y = y
+        else:
+            self.ev_samples = 0
+            if self.ev_down:
+                self.ev_down = False
+                self.event_queue.put(UP, self.ev_x, self.ev_y, ticks)
+#
+# poll_events()
+# Take a sample (or all samples of the background sampler, if it is running)
+# and update the event queue. Returns the number of waiting events.
+# After stop_sampler(), the samples left in the ring are taken first, and then
+# the touch pad is sampled directly again.
+#
+    def poll_events(self):
+        filt = self.filter
+        sample = self.sample
+        if self.ring is not None:  # take the samples of the background sampler
+            buf = self.ev_sample
+            while self.ring.get_into(buf):
+                now = self.ticks_ms()
+                ticks = now - ((now - buf[3]) & 0xffff)  # restore the full ticks value
+                if buf[0] == PEN_UP:
+                    filt.reset()
+                    self._track(False, ticks)
+                else:
+                    filt.add(buf[0], buf[1])
+                    self._track(True, ticks)
+            if self.recorder is not None:
+                self.recorder.write_pending()
+            if self.timer is not None or self.bus_sampled:
+                return self.event_queue.count()
+            self.ring = None  # the sampler is stopped and drained
+        if self.pen_down() and self.raw_touch_into(sample):
+            filt.add(sample[0], sample[1])
+            self._track(True, self.ticks_ms())
+        else:
+            filt.reset()
+            self._track(False, self.ticks_ms())
+        return self.event_queue.count()
+#
+# events(timeout=None)
+# Generator yielding the touch events as tuples (kind, x, y, ticks).
+# The touch pad is polled every delay ms. With a timeout (in ms) the generator
+# ends when no event arrived for that time.
+#
+    def events(self, timeout=None):
+        queue = self.event_queue
+        idle = 0
+        while True:
+            if self.poll_events():
+                idle = 0
+                event = queue.get()
+                while event is not None:
+                    yield event
+                    event = queue.get()
+            elif timeout is not None and idle >= timeout:
+                return
+            self.sleep_ms(self.delay)
+            idle += self.delay
+#
+# do_normalize(touch)
+# calculate the screen coordinates from the touch values, using the calibration values
+# touch must be the tuple return by get_touch
+# The calculation uses the fixed point coefficients compiled from the calibration
+# by touch_parameter(), see touch_cal.py
+#
+    def do_normalize(self, touch):
+        out = self.norm_out
+        normalize_into(touch[0], touch[1], self.cal_fp, out)
+        return (out[0], out[1])
+#
+# start_recording(stream, block=32)
+# Record the raw samples read by raw_touch_into() with a µs timestamp into stream,
+# e.g. a file opened with mode "wb". The records are written in blocks of block
+# samples, see touch_trace.py. Returns the TraceRecorder.
+# With the background sampler running, the blocks are written by poll_events(),
+# or by calling write_pending() of the recorder.
+# stop_recording() writes the remaining records and ends the recording.
+#
+    def start_recording(self, stream, block=32):
+        from touch_trace import TraceRecorder
+        self.stop_recording()
+        self.recorder = TraceRecorder(stream, block, self.ticks_us())
+        # written by poll_events() while a sampler runs
+        self.recorder.defer = self.timer is not None or self.bus_sampled
+        return self.recorder
+
+    def stop_recording(self):
+        if self.recorder is not None:
+            self.recorder.flush()
+            self.recorder = None
+#
+# raw_touch(tuple)
+# raw read touch. Returns (x,y) or None
+#
+    def raw_touch(self):
+        if self.raw_touch_into(self.sample):
+            return (self.sample[0], self.sample[1])
+        else:
+            return None
+#
+# raw_touch_into(buf, index)
+# raw read touch without allocation. If a touch is present, x and y are
+# stored in buf[index] and buf[index + 1] and True is returned, otherwise False.
+# buf is typically an array('H') or another preallocated buffer.
+# The touch resistance of the sample is stored in self.pressure. If a threshold
+# is set, samples with a higher resistance are rejected.
+#
+    def raw_touch_into(self, buf, index=0):
+        recorder = self.recorder
+        if recorder is not None:  # time of the transfer start, see ReplaySim
+            start = self.ticks_us()
+        xyz = self.read_batch()
+        x = xyz[0]
+        y = xyz[1]
+        if recorder is not None:
+            recorder.record(start, x, y, xyz[2], xyz[3])
+        self.pressure = self.touch_resistance(x, xyz[2], xyz[3])
+        if self.threshold and self.pressure > self.threshold:
+            self.pen_irq = False
+            return False
+        if x > X_LOW and y < Y_HIGH:  # touch pressed?
+            buf[index] = x
+            buf[index + 1] = y
+            return True
+        else:
+            self.pen_irq = False  # released: wait for the next PENIRQ
+            return False
+#
+# pen_down()
+# Tell without SPI traffic, whether the touch pad may be pressed.
+# In PENIRQ mode this is the case if PENIRQ fired since the last release or
+# is still low. Without an irq pin, it returns True, such that the touch pad is polled.
+#
+    def pen_down(self):
+        return self.irq is None or self.pen_irq or not self.irq()
+#
+# PENIRQ handler. Just set a flag, which is cleared again when a read
+# finds the touch pad released.
+#
+    def _irq_handler(self, pin):
+        self.pen_irq = True
+        if self.irq_flag is not None:
+            self.irq_flag.set()  # wake up the sampling thread
+#
+# touch_resistance(x, z1, z2)
+# Calculate the touch resistance in Ohm from the 12 bit values of X, Z1 and Z2:
+# Rtouch = Rx_plate * X / 4096 * (Z2 / Z1 - 1)
+# The firmer the touch, the lower the value. R_MAX is returned if there is no touch.
+# Intermediate values are clamped to stay in the small int range.
+#
+    def touch_resistance(self, x, z1, z2):
+        if z1 == 0 or z2 <= z1:
+            return R_MAX
+        r = min(x * (z2 - z1) // z1, 0x3ffff)
+        return min((r * self.x_plate) >> 12, R_MAX)
+#
+# Send a command to the touch controller and wait for the response
+# cmd:  command byte
+# bits: expected data size. Reasonable values are 8 and 12
+#
+    def touch_talk(self, cmd, bits):
+        self.xmit[0] = cmd
+        self.transport.transfer(self.xmit, self.recv)
+        return (self.recv[1] * 256 + self.recv[2]) >> (15 - bits)
+#
+# Prepare the command frame for read_batch()
+# The XPT2046 accepts the next command byte while the result of the previous
+# conversion is clocked out. So each conversion takes 2 bytes in the frame,
+# plus one trailing byte to clock out the last result. With oversample > 1,
+# the conversions of a channel follow each other, here for oversample = 2:
+# tx: X 0 X 0 Y 0 Y 0 Z1 0 Z1 0 Z2 0 Z2 0 0
+# rx: - X X X X Y Y Y Y Z1 Z1 Z1 Z1 Z2 Z2 Z2 Z2
+#
+    def _setup_batch(self, oversample):
+        size = 8 * oversample + 1
+        self.batch_xmit = bytearray(size)
+        self.batch_recv = bytearray(size)
+        i = 0
+        for cmd in (T_GETX, T_GETY, T_GETZ1_12, T_GETZ2_12):
+            for _ in range(oversample):
+                self.batch_xmit[i] = cmd
+                i += 2
+        self.oversample = oversample
+#
+# read_batch()
+# Read X, Y, Z1 and Z2 with 12 bit resolution in a single SPI transaction.
+# With oversample > 1 each channel is converted oversample times back to back
+# and the values are averaged. With oversample >= 3, the lowest and highest
+# value are dropped, so a single outlier does not spoil the sample.
+# The values are stored in self.xyz, which is returned too.
+#
+    def read_batch(self):
+        recv = self.batch_recv
+        xyz = self.xyz
+        oversample = self.oversample
+        self.transport.transfer(self.batch_xmit, recv)
+        i = 1
+        for ch in range(4):
+            acc = 0
+            lo = 0xffff
+            hi = 0
+            for _ in range(oversample):
+                v = (recv[i] << 8 | recv[i + 1]) >> 3
+                acc += v
+                if v < lo:
+                    lo = v
+                if v > hi:
+                    hi = v
+                i += 2
+            if oversample >= 3:
+                xyz[ch] = (acc - lo - hi) // (oversample - 2)
+            else:
+                xyz[ch] = acc // oversample
+        return xyz
@@ -0,0 +1,307 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Sample filters for the touch pad drivers
+#
+# RingFilter keeps the last <length> samples in a ring buffer together with
+# the running sums and sums of squares of the x and y values. Adding a sample
+# subtracts the evicted one, such that mean and deviation are available in
+# constant time, without re-summing the buffer and without heap allocation.
+# All values are 12 bit, so the sums stay within the small int range
+# of MicroPython even for length = 25.
+# The samples are stored as x, y pairs in a flat array of unsigned shorts.
+#
+# RankFilter has the same interface, but uses robust statistics: besides the
+# ring, it keeps the x and y values in sorted order, updated incrementally on
+# each sample. The position is the median or the trimmed mean, and the lowest
+# and highest values of each axis are ignored by the stability test. So a
+# single glitch sample, e.g. at press or release, does not spoil the window.
+#
+# AlphaBeta is a motion filter for following a moving touch. Unlike the mean
+# over a window, it estimates the velocity too, so it has no lag at constant
+# speed, while still smoothing the noise of the single samples.
+#
+from array import array
+from time import ticks_diff
+
+MEAN = const(0)     # filter modes of the drivers' touch_parameter()
+MEDIAN = const(1)
+TRIMMED = const(2)
+
+MIN_SAMPLES = const(3)  # fewest samples for an early decision in adaptive mode
+#
+# 64 * the 5% quantile of the chi-square distribution with 2 * (n - 1) degrees
+# of freedom, indexed by the number of samples n, see stable()
+#
+_CHI2_LOW = (0, 0, 6, 45, 104, 174, 252, 334, 420, 509, 600, 694, 789, 886, 984,
+             1083, 1183, 1284, 1386, 1489, 1592, 1696, 1801, 1906, 2012, 2118)
+
+class RingFilter:
+
+    def __init__(self, length):
+        self.length = length
+        self.adaptive = False
+        self.buff = array('H', [0] * (2 * length))  # x, y pairs
+        self.meanx = 0
+        self.meany = 0
+        self.lastx = 0  # the sample added last
+        self.lasty = 0
+        self.reset()
+#
+# Invalidate the buffer, e.g. after the touch pad has been released
+#
+    def reset(self):
+        self.ptr = 0
+        self.count = 0
+        self.sumx = 0
+        self.sumy = 0
+        self.sqx = 0
+        self.sqy = 0
+#
+# Add a sample, replacing the oldest one once the buffer is full
+#
+    def add(self, x, y):
+        buff = self.buff
+        ptr = self.ptr
+        if self.count == self.length:  # evict the oldest sample
+            ox = buff[ptr]
+            oy = buff[ptr + 1]
+            self.sumx -= ox
+            self.sumy -= oy
+            self.sqx -= ox * ox
+            self.sqy -= oy * oy
+        else:
+            self.count += 1
+        buff[ptr] = x
+        buff[ptr + 1] = y
+        self.lastx = x
+        self.lasty = y
+        self.sumx += x
+        self.sumy += y
+        self.sqx += x * x
+        self.sqy += y * y
+        ptr += 2
+        self.ptr = 0 if ptr == 2 * self.length else ptr
+#
+# Set meanx and meany to the mean of the samples in the buffer, without
+# a stability test. Used for tracking a touch once it has been accepted.
+#
+    def update_mean(self):
+        n = self.count
+        if n:
+            self.meanx = self.sumx // n
+            self.meany = self.sumy // n
+#
+# Check, whether the buffer is filled and the mean square distance of
+# the samples from their mean is not larger than margin (a squared value).
+# If yes, meanx and meany are set to the mean of the samples.
+#
+# The test is the same as the former sum((c - mean)**2) / n <= margin,
+# expanded into sum(c*c) - 2 * mean * sum(c) + n * mean * mean
+#
+# In adaptive mode, a buffer with at least MIN_SAMPLES samples is accepted
+# before it is filled, if the upper bound of the 95% confidence interval of the
+# mean square distance is not larger than margin. For n samples with the
+# variance s2 per axis, dev / s2 has a chi-square distribution with 2 * (n - 1)
+# degrees of freedom, giving the bound 2 * dev / chi2_low(n). This bound is
+# far above dev / n for few samples, so only clean samples pass early.
+#
+    def stable(self, margin):
+        n = self.count
+        if n != self.length and (n < MIN_SAMPLES or not self.adaptive):
+            return False
+        meanx = self.sumx // n
+        meany = self.sumy // n
+        dev = (self.sqx - 2 * meanx * self.sumx + n * meanx * meanx +
+               self.sqy - 2 * meany * self.sumy + n * meany * meany)
+        if n == self.length:
+            limit = margin * n
+        else:
+            limit = (margin * _CHI2_LOW[n]) >> 7
+        if dev <= limit:
+            self.meanx = meanx
+            self.meany = meany
+            return True
+        return False
+
+class RankFilter:
+
+    def __init__(self, length, mode=MEDIAN):
+        self.length = length
+        self.mode = mode
+        self.trim = length // 4  # values ignored at each end of the sorted window
+        self.adaptive = False
+        self.buff = array('H', [0] * (2 * length))  # x, y pairs in arrival order
+        self.sortx = array('H', [0] * length)
+        self.sorty = array('H', [0] * length)
+        self.meanx = 0
+        self.meany = 0
+        self.lastx = 0
+        self.lasty = 0
+        self.reset()
+
+    def reset(self):
+        self.ptr = 0
+        self.count = 0
+#
+# Replace old by new in the sorted window s of n values, moving only the
+# values in between, or insert new if old is None.
+#
+    @staticmethod
+    def _replace(s, n, old, new):
+        if old is None:
+            i = n
+        else:
+            lo, hi = 0, n - 1  # binary search for old
+            while lo < hi:
+                mid = (lo + hi) >> 1
+                if s[mid] < old:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            i = lo
+            n -= 1
+        while i < n and s[i + 1] < new:  # move up
+            s[i] = s[i + 1]
+            i += 1
+        while i > 0 and s[i - 1] > new:  # move down
+            s[i] = s[i - 1]
+            i -= 1
+        s[i] = new
+
+    def add(self, x, y):
+        buff = self.buff
+        ptr = self.ptr
+        n = self.count
+        if n == self.length:  # evict the oldest sample
+            self._replace(self.sortx, n, buff[ptr], x)
+            self._replace(self.sorty, n, buff[ptr + 1], y)
+        else:
+            self._replace(self.sortx, n, None, x)
+            self._replace(self.sorty, n, None, y)
+            self.count = n + 1
+        buff[ptr] = x
+        buff[ptr + 1] = y
+        self.lastx = x
+        self.lasty = y
+        ptr += 2
+        self.ptr = 0 if ptr == 2 * self.length else ptr
+#
+# Median or trimmed mean of the sorted window s, ignoring k values at each end
+#
+    def _center(self, s, n, k):
+        if self.mode == MEDIAN:
+            i = n >> 1
+            return s[i] if n & 1 else (s[i - 1] + s[i]) >> 1
+        acc = 0
+        for i in range(k, n - k):
+            acc += s[i]
+        return acc // (n - 2 * k)
+
+    def update_mean(self):
+        n = self.count
+        if n:
+            k = self.trim * n // self.length
+            self.meanx = self._center(self.sortx, n, k)
+            self.meany = self._center(self.sorty, n, k)
+#
+# Like RingFilter.stable(), but the mean square distance is taken from the median
+# or trimmed mean over the values without the trimmed ones.
+#
+    def stable(self, margin):
+        n = self.count
+        if n != self.length and (n < MIN_SAMPLES or not self.adaptive):
+            return False
+        k = self.trim * n // self.length
+        m = n - 2 * k  # values used per axis
+        sortx = self.sortx
+        sorty = self.sorty
+        cx = self._center(sortx, n, k)
+        cy = self._center(sorty, n, k)
+        dev = 0
+        for i in range(k, n - k):
+            d = sortx[i] - cx
+            dev += d * d
+            d = sorty[i] - cy
+            dev += d * d
+        if n == self.length:
+            limit = margin * m
+        elif m >= MIN_SAMPLES:
+            limit = (margin * _CHI2_LOW[m]) >> 7
+        else:
+            return False
+        if dev <= limit:
+            self.meanx = cx
+            self.meany = cy
+            return True
+        return False
+
+#
+# Alpha-beta filter in integer arithmetic. Positions are kept with 8 fractional
+# bits, the velocity in the same units per ms. alpha and beta are the gains for
+# position and velocity in units of 1/256. The defaults are a critically damped
+# pair, alpha = 0.5 and beta = 0.17. Smaller values smooth more, but follow
+# changes of the speed slower.
+#
+class AlphaBeta:
+
+    def __init__(self, alpha=128, beta=44):
+        self.alpha = alpha
+        self.beta = beta
+        self.start(0, 0, 0)
+#
+# Start tracking at the position x, y at time ticks (ms), e.g. at touch-down
+#
+    def start(self, x, y, ticks):
+        self.px = x << 8
+        self.py = y << 8
+        self.vx = 0
+        self.vy = 0
+        self.ticks = ticks
+        self.x = x
+        self.y = y
+#
+# Add the sample x, y taken at time ticks. The estimated position is
+# stored in self.x and self.y.
+#
+    def update(self, x, y, ticks):
+        dt = ticks_diff(ticks, self.ticks)
+        if dt < 1:
+            dt = 1
+        elif dt > 100:  # a long gap: do not extrapolate
+            dt = 100
+        self.ticks = ticks
+        alpha = self.alpha
+        beta = self.beta
+        px = self.px + self.vx * dt  # predict
+        py = self.py + self.vy * dt
+        rx = (x << 8) - px  # residuals
+        ry = (y << 8) - py
+        px += (alpha * rx) >> 8
+        py += (alpha * ry) >> 8
+        self.vx += ((beta * rx) >> 8) // dt
+        self.vy += ((beta * ry) >> 8) // dt
+        self.px = px
+        self.py = py
+        self.x = min(max((px + 128) >> 8, 0), 4095)
+        self.y = min(max((py + 128) >> 8, 0), 4095)
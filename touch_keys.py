@@ -0,0 +1,284 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+#
+# Hit test of the buttons of a keytable, as used by touchtest.py:
+#   [value, "c", (x, y, r), ...] for a circle
+#   [value, "r" or "s", (x1, y1, x2, y2), ...] for a (clipped) rectangle
+#
+# KeyIndex is built once from the keytable. It sorts the keys into the cells of
+# a uniform grid by their bounding boxes, so a touch only has to be tested
+# against the few keys of its cell. Like the scan of the keytable, the first
+# matching key of the table is found, if keys overlap.
+#
+# Keypad draws the buttons of a keytable once and then only the buttons, which
+# changed their state, giving feedback on touches.
+#
+from array import array
+from touch_queue import DOWN, UP
+
+CIRCLE = const(0)
+RECT = const(1)
+
+class KeyIndex:
+
+    def __init__(self, keytable, cell=32):
+        self.keys = keytable
+        n = len(keytable)
+        self.kind = bytearray(n)
+        self.area = array('i', [0] * (4 * n))  # x, y, r * r, 0 or x1, y1, x2, y2
+        self.cell = cell
+        x_max = y_max = 0
+        boxes = []
+        for i in range(n):
+            key = keytable[i]
+            a = key[2]
+            if key[1] == "c":
+                self.kind[i] = CIRCLE
+                self.area[4 * i:4 * i + 3] = array('i', (a[0], a[1], a[2] * a[2]))
+                box = (a[0] - a[2], a[1] - a[2], a[0] + a[2], a[1] + a[2])
+            elif key[1] in ("r", "s"):
+                self.kind[i] = RECT
+                self.area[4 * i:4 * i + 4] = array('i', a[:4])
+                box = a[:4]
+            else:  # not a button area
+                boxes.append(None)
+                continue
+            boxes.append(box)
+            x_max = max(x_max, box[2])
+            y_max = max(y_max, box[3])
+        self.cols = x_max // cell + 1
+        self.rows = y_max // cell + 1
+        cells = [[] for _ in range(self.cols * self.rows)]
+        for i in range(n):
+            if boxes[i] is None:
+                continue
+            x1, y1, x2, y2 = boxes[i]
+            for row in range(self._row(y1), self._row(y2) + 1):
+                for col in range(self._col(x1), self._col(x2) + 1):
+                    cells[row * self.cols + col].append(i)
+        empty = ()
+        self.cells = [tuple(c) if c else empty for c in cells]
+#
+# Column and row of the cell of x or y. Positions outside of the grid, e.g.
+# negative ones near the edge, belong to the border cells, which hold the
+# keys reaching beyond the grid as well.
+#
+    def _col(self, x):
+        return min(max(x // self.cell, 0), self.cols - 1)
+
+    def _row(self, y):
+        return min(max(y // self.cell, 0), self.rows - 1)
+#
+# find(x, y)
+# Return the index of the key at x, y in the keytable, or -1
+#
+    def find(self, x, y):
+        cell = self.cell
+        col = x // cell
+        row = y // cell
+        if col < 0 or row < 0 or col >= self.cols or row >= self.rows:  # same as _col(), _row()
+            col = min(max(col, 0), self.cols - 1)
+            row = min(max(row, 0), self.rows - 1)
+        cells = self.cells[row * self.cols + col]
+        kind = self.kind
+        area = self.area
+        for i in cells:
+            j = 4 * i
+            if kind[i] == CIRCLE:
+                dx = x - area[j]
+                dy = y - area[j + 1]
+                if dx * dx + dy * dy < area[j + 2]:
+                    return i
+            elif area[j] <= x <= area[j + 2] and area[j + 1] <= y <= area[j + 3]:
+                return i
+        return -1
+#
+# lookup(touch)
+# Return the value of the key at the touch (x, y), or None
+#
+    def lookup(self, touch):
+        i = self.find(touch[0], touch[1])
+        return None if i < 0 else self.keys[i][0]
+
+#
+# Get string dimensions in pixels
+#
+def get_stringsize(s, font):
+    hor = 0
+    for c in s:
+        _, vert, cols = font.get_ch(c)
+        hor += cols
+    return hor, vert
+
+def print_centered(tft, x, y, s, color, font):
+    length, height = get_stringsize(s, font)
+    tft.setTextStyle(color, None, 2, font)
+    tft.setTextPos(x - length // 2, y - height // 2)
+    tft.printString(s)
+
+NORMAL = const(0)
+PRESSED = const(1)
+DISABLED = const(2)
+
+#
+# Keypad of the buttons of a keytable, drawn on a TFT. Unlike get_from_keybd()
+# of touchtest.py, which draws all buttons with every call, the keypad is drawn
+# once by draw(), and later only the buttons whose state changed are drawn
+# again. A button is NORMAL, PRESSED while it is touched, or DISABLED, when it
+# does not respond to touches. A PRESSED button is drawn filled with the color
+# pressed, or the inverse of its color if pressed is None, a DISABLED button
+# with the color disabled.
+#
+# The touch events of the drivers are passed to handle(), or get_key() takes
+# them from the touch pad itself:
+#
+#   keypad = Keypad(mytft, keytable, font14)
+#   keypad.draw()
+#   value = keypad.get_key(mytouch)
+#
+class Keypad:
+
+    def __init__(self, tft, keytable, font, pressed=None, disabled=(96, 96, 96)):
+        self.tft = tft
+        self.font = font
+        self.index = KeyIndex(keytable)
+        self.keys = keytable
+        n = len(keytable)
+        self.state = bytearray(n)
+        self.shown = bytearray(n)  # state as drawn, 0xff = not drawn
+        for i in range(n):
+            self.shown[i] = 0xff
+        self.values = {}
+        for i in range(n):
+            self.values[keytable[i][0]] = i
+        self.pressed = pressed
+        self.disabled = disabled
+        self.active = -1  # index of the key touched at DOWN
+#
+# Draw all buttons, e.g. after the screen was cleared
+#
+    def draw(self):
+        for i in range(len(self.keys)):
+            self.shown[i] = 0xff
+        self.refresh()
+#
+# Draw the buttons whose state changed since they were drawn last
+#
+    def refresh(self):
+        state = self.state
+        shown = self.shown
+        tft = self.tft
+        fgcolor = tft.getColor()  # save old colors
+        bgcolor = tft.getBGColor()
+        for i in range(len(state)):
+            if state[i] != shown[i]:
+                self._draw_key(self.keys[i], state[i], fgcolor, bgcolor)
+                shown[i] = state[i]
+        tft.setColor(fgcolor) # restore them
+        tft.setBGColor(bgcolor)
+
+    def _draw_key(self, key, state, fgcolor, bgcolor):
+        tft = self.tft
+        dtype = key[3]
+        if not dtype:   # display the button?
+            return
+        color = key[4] if key[4] else fgcolor
+        if state == PRESSED:
+            color = self.pressed if self.pressed else (255 - color[0], 255 - color[1], 255 - color[2])
+            dtype = "f"
+        elif state == DISABLED:
+            color = self.disabled
+            dtype = "f"
+        if key[5]:  # change BG color?
+            tft.setBGColor(key[5])
+        fontcolor = key[7] if key[7] else fgcolor
+        area = key[2]
+        if key[1] == "c":  # circle
+            if dtype == "b":
+                tft.fillCircle(area[0], area[1], area[2], tft.getBGColor())  # clear a pressed state
+                tft.drawCircle(area[0], area[1], area[2], color)
+            else:
+                tft.fillCircle(area[0], area[1], area[2], color)
+            x, y = area[0], area[1]
+        else:
+            if key[1] == "r": # rectangle
+                draw, fill = tft.drawRectangle, tft.fillRectangle
+            else: # clipped rectangle
+                draw, fill = tft.drawClippedRectangle, tft.fillClippedRectangle
+            if dtype == "b":
+                fill(area[0], area[1], area[2], area[3], tft.getBGColor())
+                draw(area[0], area[1], area[2], area[3], color)
+            else:
+                fill(area[0], area[1], area[2], area[3], color)
+            x, y = (area[0] + area[2]) // 2, (area[1] + area[3]) // 2
+        if key[6]:
+            print_centered(tft, x, y, key[6], fontcolor, self.font)
+        tft.setBGColor(bgcolor)
+#
+# Set the state of the key with the given value to NORMAL, PRESSED or DISABLED.
+# The change is drawn by the next refresh().
+#
+    def set_state(self, value, state):
+        self.state[self.values[value]] = state
+
+    def get_state(self, value):
+        return self.state[self.values[value]]
+
+    def enable(self, value, enabled=True):
+        self.set_state(value, NORMAL if enabled else DISABLED)
+#
+# handle(kind, x, y)
+# Process a touch event (kind, x, y) of the drivers and draw the changes.
+# The key touched at DOWN is PRESSED as long as the touch stays on it. If the
+# touch is released on it, its value is returned, otherwise None.
+#
+    def handle(self, kind, x, y):
+        state = self.state
+        i = self.index.find(x, y)
+        value = None
+        if kind == DOWN:
+            self.active = i if i >= 0 and state[i] != DISABLED else -1
+        active = self.active
+        if active >= 0:
+            if kind == UP:
+                state[active] = NORMAL
+                if i == active:
+                    value = self.keys[active][0]
+                self.active = -1
+            else:
+                state[active] = PRESSED if i == active else NORMAL
+        self.refresh()
+        return value
+#
+# get_key(touchpad, timeout=None)
+# Wait for a key being touched and released, with feedback, and return its
+# value. Returns None after timeout ms without touch events.
+#
+    def get_key(self, touchpad, timeout=None):
+        for kind, x, y, ticks in touchpad.events(timeout):
+            value = self.handle(kind, x, y)
+            if value is not None:
+                return value
+        return None
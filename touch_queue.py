@@ -0,0 +1,216 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+# Queues for passing touch data between producers and consumers
+#
+# SampleRing is a single-producer/single-consumer ring of raw samples. The
+# producer, typically a timer callback, only writes the head index, and the
+# consumer only writes the tail index. Since the index is updated after the
+# data, no lock is needed and the producer may run in an interrupt context.
+# Nothing is allocated after creation. One slot is left empty to tell a full
+# ring from an empty one.
+#
+# Each record has four unsigned 16 bit values: x, y, pressure, ticks_ms() & 0xffff.
+# A release of the touch pad is recorded with x == y == PEN_UP.
+#
+from array import array
+
+PEN_UP = const(0xffff)
+RECORD = const(4)  # values per record
+
+class SampleRing:
+
+    def __init__(self, size):
+        self.end = (size + 1) * RECORD
+        self.buf = array('H', [0] * self.end)
+        self.head = 0  # written by the producer only
+        self.tail = 0  # written by the consumer only
+        self.dropped = 0  # number of samples lost because the ring was full
+#
+# Producer side: store a record, return False if the ring is full
+#
+    def put(self, x, y, pressure, ticks):
+        head = self.head
+        nxt = head + RECORD
+        if nxt == self.end:
+            nxt = 0
+        if nxt == self.tail:
+            self.dropped += 1
+            return False
+        buf = self.buf
+        buf[head] = x
+        buf[head + 1] = y
+        buf[head + 2] = pressure
+        buf[head + 3] = ticks & 0xffff
+        self.head = nxt  # publish the record
+        return True
+#
+# Consumer side: copy the oldest record into buf[index:index + 4],
+# return False if the ring is empty
+#
+    def get_into(self, buf, index=0):
+        tail = self.tail
+        if tail == self.head:
+            return False
+        src = self.buf
+        buf[index] = src[tail]
+        buf[index + 1] = src[tail + 1]
+        buf[index + 2] = src[tail + 2]
+        buf[index + 3] = src[tail + 3]
+        tail += RECORD
+        self.tail = 0 if tail == self.end else tail
+        return True
+#
+# Number of records waiting
+#
+    def count(self):
+        n = self.head - self.tail
+        if n < 0:
+            n += self.end
+        return n // RECORD
+#
+# Drop all waiting records. Consumer side only.
+#
+    def clear(self):
+        self.tail = self.head
+#
+# EventQueue is a bounded queue of touch events. Each event has four values:
+# kind (DOWN, MOVE or UP), x, y and ticks_ms() at the time of the event.
+# If the queue is full, a new MOVE replaces a MOVE at the end of the queue,
+# such that a lagging consumer gets the latest position without the queue
+# growing. A new DOWN or UP replaces a trailing MOVE, or else the oldest queued
+# MOVE is discarded. Without any MOVE queued, the oldest complete DOWN, UP
+# pair is discarded, so the consumer never sees a touch without its DOWN or
+# its UP. For that the queue holds at least 3 events.
+# Unlike SampleRing, the producer may change the tail, so producer and
+# consumer must run in the same thread, e.g. as uasyncio tasks.
+#
+DOWN = const(1)
+MOVE = const(2)
+UP   = const(3)
+
+class EventQueue:
+
+    def __init__(self, size=16):
+        size = max(size, 3)
+        self.size = size
+        self.buf = array('i', [0] * (size * RECORD))
+        self.clear()
+
+    def clear(self):
+        self.head = 0
+        self.tail = 0
+        self.n = 0
+        self.coalesced = 0  # number of events merged or dropped due to overflow
+
+    def count(self):
+        return self.n
+
+    def put(self, kind, x, y, ticks):
+        buf = self.buf
+        if self.n == self.size:  # full
+            self.coalesced += 1
+            last = (self.head - RECORD) % (self.size * RECORD)
+            if buf[last] == MOVE:  # overwrite the trailing MOVE
+                buf[last] = kind
+                buf[last + 1] = x
+                buf[last + 2] = y
+                buf[last + 3] = ticks
+                return
+            if kind == MOVE:  # keep the queued DOWN/UP, drop the MOVE
+                return
+            i = self._find(MOVE, 0)
+            if i >= 0:
+                self._remove(i, 1)  # discard the oldest MOVE
+            else:  # only DOWN and UP queued: discard the oldest complete touch
+                i = self._find(DOWN, 0)
+                while i >= 0 and (i + 1 == self.n or self._kind(i + 1) != UP):
+                    i = self._find(DOWN, i + 1)
+                if i >= 0:
+                    self._remove(i, 2)
+                    self.coalesced += 1
+                else:  # not reached with alternating DOWN and UP
+                    self._remove(0, 1)
+        head = self.head
+        buf[head] = kind
+        buf[head + 1] = x
+        buf[head + 2] = y
+        buf[head + 3] = ticks
+        self.head = (head + RECORD) % (self.size * RECORD)
+        self.n += 1
+#
+# Kind of the event at position i of the queue, 0 being the oldest
+#
+    def _kind(self, i):
+        return self.buf[(self.tail + i * RECORD) % (self.size * RECORD)]
+#
+# Position of the oldest event of kind at position start or later, or -1
+#
+    def _find(self, kind, start):
+        for i in range(start, self.n):
+            if self._kind(i) == kind:
+                return i
+        return -1
+#
+# Remove count events at position i, moving the newer ones down
+#
+    def _remove(self, i, count):
+        buf = self.buf
+        length = self.size * RECORD
+        dst = (self.tail + i * RECORD) % length
+        src = (dst + count * RECORD) % length
+        for _ in range(i + count, self.n):
+            for k in range(RECORD):
+                buf[dst + k] = buf[src + k]
+            dst = (dst + RECORD) % length
+            src = (src + RECORD) % length
+        self.head = dst
+        self.n -= count
+#
+# Copy the oldest event into buf[index:index + 4] and return True,
+# or return False if the queue is empty
+#
+    def get_into(self, buf, index=0):
+        if self.n == 0:
+            return False
+        src = self.buf
+        tail = self.tail
+        buf[index] = src[tail]
+        buf[index + 1] = src[tail + 1]
+        buf[index + 2] = src[tail + 2]
+        buf[index + 3] = src[tail + 3]
+        self.tail = (tail + RECORD) % (self.size * RECORD)
+        self.n -= 1
+        return True
+#
+# Return the oldest event as tuple (kind, x, y, ticks), or None
+#
+    def get(self):
+        if self.n == 0:
+            return None
+        src = self.buf
+        tail = self.tail
+        event = (src[tail], src[tail + 1], src[tail + 2], src[tail + 3])
+        self.tail = (tail + RECORD) % (self.size * RECORD)
+        self.n -= 1
+        return event
@@ -0,0 +1,137 @@
+#
+# The MIT License (MIT)
+#
+# Copyright (c) 2017 Robert Hammelrath
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
+#
+# Recording of the raw touch pad samples, for the analysis and offline
+# replay of touch sessions, see start_recording() of the drivers and
+# sim.xpt2046.ReplaySim.
+#
+# The log is a binary stream, starting with the 12 byte header
+#   b'XPTT', version, record size, 0, 0, ticks_us at the start (32 bit)
+# followed by fixed size records, little endian:
+#   ticks_us (32 bit), X, Y, Z1, Z2 (16 bit each, raw 12 bit conversions)
+#
+# The time stamps are in µs, such that a replay keeps the intervals of the
+# samples exactly, not only to 1 ms. ticks_us() values are below 2**30 and
+# stored as they are: masking them to 32 bit would create a long int, and
+# record() must not allocate memory. They wrap after about 17 minutes, which
+# is harmless as long as the samples are less than that apart.
+#
+# The records are collected in blocks, which are written when full. While
+# record() may be called in an interrupt context (deferred mode), the blocks
+# are only handed over and written by write_pending() later. In that mode one
+# block is filled while the other one waits for being written. Records are
+# dropped if both are full.
+#
+from struct import pack, pack_into, unpack_from
+from time import ticks_us
+
+MAGIC = b'XPTT'
+VERSION = const(2)
+FORMAT = '<IHHHH'
+RECORD_SIZE = const(12)
+HEADER_SIZE = const(12)
+
+# stream: binary stream the log is written to
+# block: number of records per block
+# start: ticks_us() value of the recording start, default: that of time
+#
+class TraceRecorder:
+
+    def __init__(self, stream, block=32, start=None):
+        self.stream = stream
+        self.size = block * RECORD_SIZE
+        self.buf = bytearray(self.size)      # block being filled
+        self.spare = bytearray(self.size)    # block for writing
+        self.pos = 0
+        self.pending = False  # spare holds a full block
+        self.defer = False    # do not write in record(), see write_pending()
+        self.records = 0
+        self.dropped = 0
+        if start is None:
+            start = ticks_us()
+        stream.write(MAGIC + pack('<BBHI', VERSION, RECORD_SIZE, 0, start))
+
+    def record(self, ticks, x, y, z1, z2):
+        pos = self.pos
+        if pos == self.size:  # the previous block could not be handed over
+            self.dropped += 1
+            return False
+        pack_into(FORMAT, self.buf, pos, ticks, x, y, z1, z2)
+        self.records += 1
+        pos += RECORD_SIZE
+        self.pos = pos
+        if pos == self.size:
+            if not self.pending:  # swap the blocks
+                self.buf, self.spare = self.spare, self.buf
+                self.pending = True
+                self.pos = 0
+            if not self.defer:
+                self.write_pending()
+        return True
+#
+# Write a completed block. Must not be called in an interrupt context.
+#
+    def write_pending(self):
+        if self.pending:
+            self.stream.write(self.spare)
+            self.pending = False
+            if self.pos == self.size:  # pick up a block filled meanwhile
+                self.buf, self.spare = self.spare, self.buf
+                self.pos = 0
+                self.pending = True
+                self.write_pending()
+#
+# Write all records, including those of an incomplete block
+#
+    def flush(self):
+        self.write_pending()
+        if self.pos:
+            self.stream.write(memoryview(self.buf)[:self.pos])
+            self.pos = 0
+        if hasattr(self.stream, "flush"):
+            self.stream.flush()
+
+    def close(self):
+        self.flush()
+        self.stream.close()
+#
+# Read the header of a log, returning the tuple (start ticks, record size)
+#
+def read_header(stream):
+    header = stream.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE or header[:4] != MAGIC or header[4] != VERSION:
+        raise ValueError("not a touch trace")
+    return unpack_from('<I', header, 8)[0], header[5]
+#
+# Generator returning the records of a log as tuples (ticks, x, y, z1, z2).
+# If size is None, the header is read first.
+#
+def read_records(stream, size=None):
+    if size is None:
+        size = read_header(stream)[1]
+    while True:
+        data = stream.read(size)
+        if len(data) < size:
+            return
+        yield unpack_from(FORMAT, data)
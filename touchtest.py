@@ -5,24 +5,9 @@ import os, gc
 from uctypes import addressof
 from tft import *
 from touch import *
+from touch_keys import KeyIndex, Keypad, print_centered
 import font14
 
-#
-# Get string dimensions in pixels
-# 
-def get_stringsize(s, font):
-    hor = 0
-    for c in s:
-        _, vert, cols = font.get_ch(c)
-        hor += cols
-    return hor, vert
-
-def print_centered(tft, x, y, s, color, font):
-    length, height = get_stringsize(s, font)
-    tft.setTextStyle(color, None, 2, font)
-    tft.setTextPos(x - length // 2, y - height // 2)
-    tft.printString(s)
-
 #
 # buttonarray for touchpad:
 #
@@ -41,7 +26,16 @@ keytable = [
     [ "Q", "s", (260, 30, 320, 70), "f", (128, 128, 128), False, "Quit", False],
 ]
 
+#
+# Draw the buttons and wait for a touch. keytable may be a keytable or a KeyIndex
+# built from it once, which is faster if get_from_keybd() is called repeatedly
+# with the same keytable. touch_keys.Keypad draws the buttons only once.
+#
 def get_from_keybd(tft, touchpad, keytable, font):
+    index = None
+    if isinstance(keytable, KeyIndex):
+        index = keytable
+        keytable = index.keys
 #
 # first, check, if buttons are to be displayed
 #
@@ -91,6 +85,8 @@ def get_from_keybd(tft, touchpad, keytable, font):
 # check whether it is in one of the button areas
 #
     if value:  # did not get a None
+        if index is not None:
+            return index.lookup(value)
         for key in keytable:
             if key[1] == "c":  # circler
                 dx = value[0] - key[2][0]
@@ -108,9 +104,11 @@ def main():
     mytouch = TOUCH("XPT2046")
     mytft.backlight(100) # light on
     
+    keypad = Keypad(mytft, keytable, font14)
+    keypad.draw()
     rtn = ""
     while rtn != "Q":
-        rtn = get_from_keybd(mytft, mytouch, keytable, font14)
+        rtn = keypad.get_key(mytouch)
         print("Returned: ", rtn)
         mytft.setTextPos(0, 150)
         mytft.setTextStyle(None, None, 0, font14)